@@ -0,0 +1,65 @@
+import os
+import secrets
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from mcp_servers import profiling
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+router = APIRouter(prefix="/admin")
+
+def require_admin(token):
+  """Reject the request unless it carries the configured admin token"""
+  if not ADMIN_TOKEN:
+    raise HTTPException(status_code=403, detail="Set ADMIN_TOKEN to use the admin routes")
+  if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+    raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def require_profiling(token):
+  require_admin(token)
+  if not profiling.PROFILING_ENABLED:
+    raise HTTPException(status_code=404, detail="Profiling is disabled, set PROFILING_ENABLED=1")
+
+@router.post("/profile/sample")
+def start_sampling(seconds: float = 10, interval_ms: float = profiling.SAMPLE_INTERVAL_MS,
+                   x_admin_token: str = Header(None)):
+  """Sample all thread stacks for `seconds` and write a collapsed-stack file"""
+  require_profiling(x_admin_token)
+  try:
+    return profiling.sampler.start(seconds, interval_ms)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  except RuntimeError as e:
+    raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/profile/sample")
+def sampling_status(x_admin_token: str = Header(None)):
+  require_profiling(x_admin_token)
+  return profiling.sampler.status()
+
+@router.get("/profile/sample/latest", response_class=PlainTextResponse)
+def latest_samples(x_admin_token: str = Header(None)):
+  """Download the collapsed stacks of the last finished sampling session"""
+  require_profiling(x_admin_token)
+  last = profiling.sampler.last
+  if not last:
+    raise HTTPException(status_code=404, detail="No finished sampling session yet")
+  with open(last["file"], encoding="utf-8") as f:
+    return f.read()
+
+@router.post("/profile/tool")
+def profile_tool(name: str = None, top_k: int = 5, x_admin_token: str = Header(None)):
+  """Start cProfiling every call of tool `name` (omit `name` to stop)"""
+  require_profiling(x_admin_token)
+  try:
+    profiling.tool_profiler.configure(name, top_k)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  return {"tool": name, "top_k": top_k}
+
+@router.get("/profile/tool")
+def tool_profile_report(limit: int = 25, x_admin_token: str = Header(None)):
+  """Slowest captured calls of the profiled tool with their top functions"""
+  require_profiling(x_admin_token)
+  return profiling.tool_profiler.report(limit)
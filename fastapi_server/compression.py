@@ -0,0 +1,66 @@
+import os
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+try:
+  import brotli
+except ImportError:  # gzip only
+  brotli = None
+
+# Responses smaller than this many bytes are sent as-is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Fast settings: tool outputs are compressed per response, never cached
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+def accepted_encodings(header):
+  """Content codings an Accept-Encoding header allows (q > 0)"""
+  accepted = set()
+  for part in header.split(","):
+    coding, _, params = part.strip().partition(";")
+    q = params.strip()
+    if q.startswith("q="):
+      try:
+        if float(q[2:]) <= 0:
+          continue
+      except ValueError:
+        continue
+    if coding:
+      accepted.add(coding.strip().lower())
+  return accepted
+
+class BrotliResponder(IdentityResponder):
+  content_encoding = "br"
+
+  def __init__(self, app, minimum_size, quality):
+    super().__init__(app, minimum_size)
+    self.compressor = brotli.Compressor(quality=quality)
+
+  def apply_compression(self, body, *, more_body):
+    if more_body:
+      return self.compressor.process(body) + self.compressor.flush()
+    return self.compressor.process(body) + self.compressor.finish()
+
+class CompressionMiddleware:
+  """Brotli or gzip for responses above COMPRESSION_MIN_SIZE, whichever the client prefers.
+
+  Event streams and responses that already carry a Content-Encoding are left
+  alone (starlette's responders skip them).
+  """
+
+  def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+    self.app = app
+    self.minimum_size = minimum_size
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    accepted = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+    if brotli is not None and "br" in accepted:
+      responder = BrotliResponder(self.app, self.minimum_size, COMPRESSION_BROTLI_QUALITY)
+    elif "gzip" in accepted:
+      responder = GZipResponder(self.app, self.minimum_size, compresslevel=COMPRESSION_GZIP_LEVEL)
+    else:
+      responder = IdentityResponder(self.app, self.minimum_size)
+    await responder(scope, receive, send)
@@ -0,0 +1,81 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from fastapi_server.shutdown import drain
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts of warm-up steps that failed (e.g. MongoDB not reachable yet)
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+router = APIRouter()
+
+class StepSkipped(Exception):
+  """Raised by a warm-up step that cannot succeed by retrying (e.g. a missing setting)"""
+
+class Readiness:
+  """Runs the warm-up steps and records whether the process is ready for traffic"""
+
+  def __init__(self):
+    self.ready = False
+    self.started_at = time.time()
+    self.ready_after = None
+    self.steps = {}
+
+  async def warm_up(self, steps):
+    """Run each (name, function) step, retrying failed ones until all succeed.
+
+    Coroutine functions are awaited, blocking ones run in a thread.
+    """
+    start = time.perf_counter()
+    pending = dict(steps)
+    for name in pending:
+      self.steps[name] = {"status": "pending"}
+    while True:
+      for name, step in list(pending.items()):
+        step_start = time.perf_counter()
+        try:
+          if inspect.iscoroutinefunction(step):
+            await step()
+          else:
+            await asyncio.to_thread(step)
+        except StepSkipped as e:
+          logger.error(f"Warm-up step {name} skipped: {e}")
+          self.steps[name] = {"status": "skipped", "error": str(e)}
+          del pending[name]
+          continue
+        except Exception as e:
+          logger.warning(f"Warm-up step {name} failed, retrying in {WARMUP_RETRY_INTERVAL:g}s: {e}")
+          self.steps[name] = {"status": "failed", "error": str(e),
+                              "attempts": self.steps[name].get("attempts", 0) + 1}
+          continue
+        self.steps[name] = {"status": "done", "seconds": round(time.perf_counter() - step_start, 3)}
+        del pending[name]
+      if not pending:
+        break
+      await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+    self.ready_after = round(time.perf_counter() - start, 3)
+    self.ready = True
+    logger.info(f"Warm-up finished in {self.ready_after}s, ready for traffic")
+
+  def snapshot(self):
+    return {"ready": self.ready, "ready_after_seconds": self.ready_after, "steps": self.steps}
+
+readiness = Readiness()
+
+@router.get("/healthz")
+def healthz():
+  """Liveness: the process is up and serving requests"""
+  return {"status": "ok", "uptime_seconds": round(time.time() - readiness.started_at, 1)}
+
+@router.get("/readyz")
+def readyz():
+  """Readiness: 200 once every warm-up step has succeeded or been skipped, 503 until then and while draining"""
+  ready = readiness.ready and not drain.draining
+  return JSONResponse({**readiness.snapshot(), "ready": ready, "draining": drain.draining},
+                      status_code=200 if ready else 503)
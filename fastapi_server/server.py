@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import os
 import sys
 import contextlib
@@ -5,25 +7,57 @@ from fastapi import FastAPI
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from mcp_servers.expense_tracker import mcp as expense_tracker_mcp
-from mcp_servers.eval_expression import mcp as exp_eval_mcp
-from mcp_servers.weather_mcp import mcp as weather_mcp
+from mcp_servers import access_log, metrics, tracing
+from fastapi_server.admin import router as admin_router
+from fastapi_server.compression import CompressionMiddleware
+from fastapi_server.health import readiness, router as health_router
+from fastapi_server.services import SERVICES, select_services
+from fastapi_server.shutdown import SHUTDOWN_GRACE_PERIOD, drain
 
-# Create the SSE apps first to initialize session managers
-expense_tracker_sse_app = expense_tracker_mcp.sse_app()
-exp_eval_sse_app = exp_eval_mcp.sse_app()
-weather_sse_app = weather_mcp.sse_app()
+logger = logging.getLogger(__name__)
+
+# Comma-separated services to mount (default all); the others are never imported
+MCP_SERVICES = os.getenv("MCP_SERVICES", ",".join(SERVICES))
+# "sse" (default) or "streamable-http" for stateless sessions that any worker can serve
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "sse")
+
+# Each service imports its MCP server on first use, so the port is bound before any of them loads
+services = select_services(MCP_SERVICES, MCP_TRANSPORT)
 
 @contextlib.asynccontextmanager
 async def lifespan(app :FastAPI):
-  # SSE apps handle their own lifecycle, no need for manual session management
+  # Warm-up starts every service in the background (including the streamable
+  # HTTP session managers), so the first tool calls find warm pools and caches,
+  # and /readyz turns 200 once it is done
+  warm_up = asyncio.create_task(readiness.warm_up([(service.name, service.warm_up) for service in services]))
+  drain.install()
   yield
-    
+  # Usually already started by the signal; then flush logs and close clients and pools.
+  # The access log goes first: its sampled explain() reads use the expense tracker's MongoDB client
+  await drain.begin()
+  warm_up.cancel()
+  await asyncio.to_thread(access_log.shutdown)
+  await asyncio.gather(*(service.aclose() for service in services))
+  await asyncio.to_thread(tracing.shutdown)
+  logger.info(f"Shutdown complete: {drain.report}")
+
 app = FastAPI(lifespan=lifespan)
-app.mount("/expense_tracker", expense_tracker_sse_app)
-app.mount("/exp_eval", exp_eval_sse_app)
-app.mount("/weather", weather_sse_app)
+app.add_middleware(CompressionMiddleware)
+app.include_router(admin_router)
+app.include_router(health_router)
+metrics.register("startup", readiness.snapshot)
+metrics.register("services", lambda: {service.name: service.snapshot() for service in services})
+metrics.register("shutdown", drain.snapshot)
+
+@app.get("/metrics")
+def get_metrics():
+  """Counters from every registered component (caches, pools, quotas)"""
+  return metrics.snapshot()
+
+for service in services:
+  app.mount(f"/{service.name}", service)
 
 if __name__ == '__main__':
   import uvicorn
-  uvicorn.run(app,host='0.0.0.0',port = 8000)
+  # Connections still open after the drain are cut a little later
+  uvicorn.run(app,host='0.0.0.0',port = 8000, timeout_graceful_shutdown=SHUTDOWN_GRACE_PERIOD + 5)
@@ -0,0 +1,161 @@
+import asyncio
+import importlib
+import inspect
+import logging
+import os
+import threading
+import time
+from starlette.responses import JSONResponse
+
+from fastapi_server.health import StepSkipped
+from fastapi_server.shutdown import drain
+
+logger = logging.getLogger(__name__)
+
+# MCP servers the combined app can mount: mount path name -> module defining `mcp`
+SERVICES = {
+  "expense_tracker": "mcp_servers.expense_tracker",
+  "exp_eval": "mcp_servers.eval_expression",
+  "weather": "mcp_servers.weather_mcp",
+}
+
+# "sse": one long-lived connection per session, pinned to the process that opened it.
+# "streamable-http": stateless requests at <mount>/mcp that any worker can answer.
+TRANSPORTS = ("sse", "streamable-http")
+
+# Streamable HTTP only: answer with application/json rather than an event stream
+MCP_JSON_RESPONSE = os.getenv("MCP_JSON_RESPONSE", "1").lower() in ("1", "true", "yes")
+
+class LazyService:
+  """ASGI app that imports an MCP server module and builds its transport app on first use.
+
+  A module that fails to import (e.g. a missing setting) disables only this
+  service: its requests get a 503 and the other services keep working.
+  """
+
+  def __init__(self, name, module_name, transport="sse"):
+    self.name = name
+    self.module_name = module_name
+    self.transport = transport
+    self.module = None
+    self.app = None
+    self.error = None
+    self.load_seconds = None
+    self._lock = threading.Lock()
+    # Streamable HTTP only: the task running the session manager, and its start/stop signals
+    self._runner = None
+    self._running = None
+    self._stop = None
+
+  def load(self):
+    """Import the module and build its app once; raises StepSkipped if that failed"""
+    with self._lock:
+      if self.app is None and self.error is None:
+        start = time.perf_counter()
+        try:
+          self.module = importlib.import_module(self.module_name)
+          if self.transport == "streamable-http":
+            self.module.mcp.settings.stateless_http = True
+            # Plain JSON bodies instead of one-event streams, so large results can be compressed
+            self.module.mcp.settings.json_response = MCP_JSON_RESPONSE
+            self.app = self.module.mcp.streamable_http_app()
+          else:
+            self.app = self.module.mcp.sse_app()
+        except Exception as e:
+          logger.error(f"MCP service {self.name} is disabled: {e}")
+          self.error = str(e)
+        self.load_seconds = round(time.perf_counter() - start, 3)
+    if self.error is not None:
+      raise StepSkipped(f"{self.name}: {self.error}")
+    return self.app
+
+  async def start(self):
+    """Load the service and, for streamable HTTP, start its session manager; raises StepSkipped if either failed"""
+    app = self.app or await asyncio.to_thread(self.load)
+    if self.transport == "streamable-http":
+      if self._runner is None:
+        self._running, self._stop = asyncio.Event(), asyncio.Event()
+        # Its task group must be entered and left by the same long-lived task, not by a request
+        self._runner = asyncio.create_task(self._run_session_manager())
+      await self._running.wait()
+      if self.error is not None:
+        raise StepSkipped(f"{self.name}: {self.error}")
+    return app
+
+  async def _run_session_manager(self):
+    try:
+      async with self.module.mcp.session_manager.run():
+        self._running.set()
+        await self._stop.wait()
+    except Exception as e:
+      # A session manager runs only once, so the service stays disabled
+      logger.error(f"MCP service {self.name} is disabled, its session manager failed: {e}")
+      self.error = str(e)
+    finally:
+      # Release the requests waiting in start() even if it never got running
+      self._running.set()
+
+  async def aclose(self):
+    """Stop the session manager, if one was started, then run the module's own close()"""
+    if self._runner is not None:
+      self._stop.set()
+      await self._runner
+    close = getattr(self.module, "close", None)
+    if close is None:
+      return
+    try:
+      if inspect.iscoroutinefunction(close):
+        await close()
+      else:
+        await asyncio.to_thread(close)
+    except Exception as e:
+      logger.error(f"Closing MCP service {self.name} failed: {e}")
+
+  async def warm_up(self):
+    """Start the service, then run the module's own warm_up() if it has one"""
+    await self.start()
+    warm_up = getattr(self.module, "warm_up", None)
+    if warm_up is None:
+      return
+    try:
+      await asyncio.to_thread(warm_up)
+    except ValueError as e:
+      raise StepSkipped(f"{self.name}: {e}") from e
+
+  def _opens_session(self, scope):
+    # An SSE session starts with GET <mount>/sse; in stateless mode every request is a session
+    return self.transport == "streamable-http" or scope["method"] == "GET"
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] == "http" and drain.draining and self._opens_session(scope):
+      response = JSONResponse({"detail": "Server is shutting down"}, status_code=503, headers={"Retry-After": "5"})
+      await response(scope, receive, send)
+      return
+    app = self.app
+    if app is None or self.transport == "streamable-http":
+      try:
+        app = await self.start()
+      except StepSkipped as e:
+        if scope["type"] == "http":
+          response = JSONResponse({"detail": f"Service unavailable: {e}"}, status_code=503)
+          await response(scope, receive, send)
+        return
+    if scope["type"] == "http" and self.transport == "sse" and scope["method"] == "GET":
+      # Close the stream once running calls are drained instead of holding up the shutdown
+      await drain.until_drained(app(scope, receive, send))
+    else:
+      await app(scope, receive, send)
+
+  def snapshot(self):
+    return {"loaded": self.app is not None, "transport": self.transport,
+            "load_seconds": self.load_seconds, "error": self.error}
+
+def select_services(spec, transport="sse"):
+  """LazyService for each comma-separated name in spec (a ValueError names unknown ones)"""
+  if transport not in TRANSPORTS:
+    raise ValueError(f"Unknown MCP_TRANSPORT {transport}; choose from {', '.join(TRANSPORTS)}")
+  names = [name.strip() for name in spec.split(",") if name.strip()]
+  unknown = [name for name in names if name not in SERVICES]
+  if unknown:
+    raise ValueError(f"Unknown MCP_SERVICES {', '.join(unknown)}; choose from {', '.join(SERVICES)}")
+  return [LazyService(name, SERVICES[name], transport) for name in dict.fromkeys(names)]
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import logging
+import os
+import signal
+import threading
+import time
+
+from mcp_servers import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Seconds running tool calls get to finish once a shutdown starts
+SHUTDOWN_GRACE_PERIOD = float(os.getenv("SHUTDOWN_GRACE_PERIOD", "20"))
+
+class Drain:
+  """Stops new MCP sessions and waits for running tool calls when the server shuts down.
+
+  Draining starts on SIGTERM/SIGINT. The server's own signal handler runs
+  only once it is done: uvicorn (and sse-starlette, which hooks it) would
+  otherwise close the SSE streams at once, dropping the results of the calls
+  being waited for. A second signal stops the server immediately.
+  """
+
+  def __init__(self, grace_period=SHUTDOWN_GRACE_PERIOD):
+    self.grace_period = grace_period
+    self.draining = False
+    self.report = None
+    self._task = None
+    self._drained = None
+
+  def install(self):
+    """Drain when the process is asked to stop, then hand the signal to the server's own handler"""
+    loop = asyncio.get_running_loop()
+    self._drained = asyncio.Event()
+    if threading.current_thread() is not threading.main_thread():
+      return
+    for sig in (signal.SIGTERM, signal.SIGINT):
+      previous = signal.getsignal(sig)
+      if not callable(previous):
+        continue
+      def handler(signum, frame, previous=previous):
+        if self.draining:
+          previous(signum, frame)
+          return
+        self.draining = True
+        loop.call_soon_threadsafe(self.begin, functools.partial(previous, signum, frame))
+      signal.signal(sig, handler)
+
+  def begin(self, then=None):
+    """Start draining (once) and call then() when done; returns the draining task"""
+    if self._task is None:
+      self.draining = True
+      logger.info(f"Draining: refusing new MCP sessions, waiting up to {self.grace_period:g}s "
+                  f"for {instrumentation.in_flight()} running tool call(s)")
+      self._task = asyncio.create_task(self._drain())
+    if then is not None:
+      self._task.add_done_callback(lambda _: then())
+    return self._task
+
+  async def _drain(self):
+    start = time.perf_counter()
+    deadline = time.monotonic() + self.grace_period
+    while instrumentation.in_flight() and time.monotonic() < deadline:
+      await asyncio.sleep(0.05)
+    aborted = instrumentation.in_flight()
+    if not aborted:
+      # The last results are written to their streams just after the calls return
+      await asyncio.sleep(0.5)
+    self.report = {"drain_seconds": round(time.perf_counter() - start, 3), "aborted_calls": aborted,
+                   "grace_period_seconds": self.grace_period}
+    if aborted:
+      logger.warning(f"Drain timed out after {self.report['drain_seconds']}s, aborting {aborted} tool call(s)")
+    else:
+      logger.info(f"Drained in {self.report['drain_seconds']}s")
+    self._drained.set()
+
+  async def until_drained(self, coro):
+    """Run coro (a long-lived SSE stream) but cancel it once draining is done"""
+    if self._drained is None:
+      return await coro
+    task = asyncio.ensure_future(coro)
+    drained = asyncio.ensure_future(self._drained.wait())
+    try:
+      await asyncio.wait([task, drained], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+      drained.cancel()
+      if not task.done():
+        task.cancel()
+    try:
+      await task
+    except asyncio.CancelledError:
+      if not self._drained.is_set():
+        raise
+
+  def snapshot(self):
+    return {"draining": self.draining, "in_flight_calls": instrumentation.in_flight(), "last_drain": self.report}
+
+drain = Drain()
@@ -0,0 +1,256 @@
+"""JSON-lines access log with one line per MCP tool call.
+
+Each line records who called which tool and what the call cost: duration,
+MongoDB round trips, documents returned (and examined, for sampled calls),
+response size and whether the answer came from a cache. Argument *values* are never
+logged, only their shape, so passwords and expense text stay out of the log.
+
+Log records go through a ``QueueHandler`` and are written by a
+``QueueListener`` thread, so a tool call only pays for a queue put.
+
+    ACCESS_LOG=access.jsonl        file to append to ('-' for stderr, empty to disable)
+    ACCESS_LOG_EXPLAIN_EVERY=50    for the first and every Nth call of each tool, re-run
+                                   its Mongo reads with explain() on the writer thread to
+                                   fill in docs_examined (1 = every call, 0 = never)
+
+Sampling keeps the extra explain reads to about 1/N of the read load;
+docs_examined is null on calls that were not sampled.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+from mcp_servers.query_plans import docs_examined, explain_command
+
+ACCESS_LOG = os.getenv('ACCESS_LOG', 'access.jsonl')
+ACCESS_LOG_EXPLAIN_EVERY = int(os.getenv('ACCESS_LOG_EXPLAIN_EVERY', '50'))
+
+# Reads worth explaining to learn how many documents the server examined
+EXPLAINED_READS = ('find', 'aggregate', 'count', 'distinct')
+
+logger = logging.getLogger('mcp.access')
+logger.propagate = False
+
+_current_call = contextvars.ContextVar('current_call', default=None)
+_explain_client_factory = None
+_explain_client = None
+_explain_counts = Counter()
+_explain_lock = threading.Lock()
+
+
+class CallRecord:
+    """Cost accounting for one tool call, filled in while the call runs"""
+
+    __slots__ = ('ts', 'server', 'tool', 'session', 'user_id', 'args', 'duration_ms', 'mongo_round_trips',
+                 'docs_examined', 'docs_returned', 'response_bytes', 'cache', 'error', 'reads', 'explain')
+
+    def __init__(self, server, tool, session, args):
+        self.ts = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.server = server
+        self.tool = tool
+        self.session = session
+        self.user_id = None
+        self.args = args
+        self.duration_ms = None
+        self.mongo_round_trips = 0
+        self.docs_examined = None
+        self.docs_returned = 0
+        self.response_bytes = None
+        self.cache = None
+        self.error = None
+        self.reads = []
+        self.explain = False
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('reads', 'explain')}
+
+
+def _sample_explain(tool):
+    """Whether to explain this call's reads: the first and every Nth call of each tool"""
+    if ACCESS_LOG_EXPLAIN_EVERY <= 0:
+        return False
+    with _explain_lock:
+        count = _explain_counts[tool]
+        _explain_counts[tool] = count + 1
+    return count % ACCESS_LOG_EXPLAIN_EVERY == 0
+
+
+def argument_shape(arguments: dict) -> dict:
+    """Describe arguments by type (and length for strings/sequences) without their values"""
+    shape = {}
+    for name, value in arguments.items():
+        if value is None:
+            shape[name] = 'null'
+        elif isinstance(value, (str, bytes, list, tuple, dict)):
+            shape[name] = f"{type(value).__name__}[{len(value)}]"
+        else:
+            shape[name] = type(value).__name__
+    return shape
+
+
+def current_call():
+    """The record of the tool call running in this context, or None"""
+    return _current_call.get()
+
+
+def note_cache(status: str):
+    """Mark the running call as answered from cache ('hit', 'miss', 'stale', ...)"""
+    call = _current_call.get()
+    if call is not None:
+        call.cache = status
+
+
+@contextmanager
+def record_call(server, tool, arguments, session=None, current_user=None):
+    """Account for one tool call and queue its log line when the call ends"""
+    if not ACCESS_LOG:
+        yield None
+        return
+    call = CallRecord(server, tool, session, argument_shape(arguments))
+    call.explain = _sample_explain(tool)
+    # Resolve the user before and after, so both login and logout calls are attributed
+    user_before = current_user() if current_user is not None else None
+    token = _current_call.set(call)
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        call.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        _current_call.reset(token)
+        call.user_id = (current_user() if current_user is not None else None) or user_before
+        logger.info(call)
+
+
+def set_result(call, result):
+    """Record the size of a tool's response"""
+    if call is None:
+        return
+    if isinstance(result, str):
+        call.response_bytes = len(result.encode('utf-8'))
+    else:
+        call.response_bytes = len(str(result).encode('utf-8'))
+
+
+def set_explain_client(factory):
+    """Give the writer thread a way to reach MongoDB for the sampled explain() reads"""
+    global _explain_client_factory
+    _explain_client_factory = factory
+
+
+class _MongoCallStats(monitoring.CommandListener):
+    """Count round trips and returned documents for the call running in this context"""
+
+    def started(self, event):
+        call = _current_call.get()
+        if call is None:
+            return
+        call.mongo_round_trips += 1
+        if call.explain and event.command_name in EXPLAINED_READS:
+            call.reads.append((event.database_name, copy.deepcopy(dict(event.command))))
+
+    def succeeded(self, event):
+        call = _current_call.get()
+        if call is None:
+            return
+        reply = event.reply
+        cursor = reply.get('cursor')
+        if cursor:
+            call.docs_returned += len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+        elif event.command_name in ('update', 'delete', 'count'):
+            call.docs_returned += reply.get('n', 0)
+
+    def failed(self, event):
+        pass
+
+
+class _JsonLinesHandler(logging.Handler):
+    """Write CallRecords as JSON lines (runs on the listener thread)"""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+
+    def emit(self, record):
+        try:
+            call = record.msg
+            if isinstance(call, CallRecord):
+                if call.reads:
+                    try:
+                        call.docs_examined = self._docs_examined(call.reads)
+                    except Exception as e:
+                        # A failed explain must not cost the line itself
+                        logging.getLogger(__name__).warning(f"explain() for the access log failed: {e}")
+                line = json.dumps(call.to_dict(), separators=(',', ':'))
+            else:
+                line = json.dumps({'message': record.getMessage()})
+            self.target.emit(logging.makeLogRecord({'msg': line, 'levelno': record.levelno}))
+        except Exception:
+            self.handleError(record)
+
+    def _docs_examined(self, reads):
+        global _explain_client
+        if _explain_client is None:
+            if _explain_client_factory is None:
+                return None
+            _explain_client = _explain_client_factory()
+        total = 0
+        for db_name, command in reads:
+            examined = docs_examined(explain_command(_explain_client[db_name], command))
+            if examined is None:
+                return None
+            total += examined
+        return total
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Keep the CallRecord object intact; formatting happens on the writer thread
+        return record
+
+
+_listener = None
+
+
+def _start():
+    global _listener
+    if ACCESS_LOG == '-':
+        target = logging.StreamHandler()
+    else:
+        target = logging.FileHandler(ACCESS_LOG, encoding='utf-8', delay=True)
+    target.setFormatter(logging.Formatter('%(message)s'))
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(_RecordQueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(log_queue, _JsonLinesHandler(target))
+    _listener.start()
+    monitoring.register(_MongoCallStats())
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Write out every queued line and stop the writer thread"""
+    global _listener, _explain_client
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    # The client belongs to the expense tracker, which closes it
+    _explain_client = None
+
+
+if ACCESS_LOG:
+    _start()
@@ -0,0 +1,48 @@
+"""Signed bearer tokens for the expense tracker.
+
+A token is ``<payload>.<signature>``: the base64url JSON payload carries the
+user id, username and expiry, and the signature is an HMAC-SHA256 of it with
+a server secret. Any process holding the secret can check a token without
+shared session state, which is what lets the server run several workers.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload, secret):
+    return _b64encode(hmac.new(secret.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def issue(user_id, username, secret, ttl):
+    """A token for user_id/username valid for ttl seconds"""
+    payload = _b64encode(json.dumps({'sub': user_id, 'name': username, 'exp': int(time.time()) + ttl},
+                                    separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_sign(payload, secret)}"
+
+
+def verify(token, secret):
+    """(user_id, username) of a valid token; ValueError if it is forged, malformed or expired"""
+    try:
+        payload, _, signature = token.partition('.')
+        # Compared as bytes: compare_digest refuses non-ASCII str, and _sign refuses a non-ASCII payload
+        if not payload or not hmac.compare_digest(signature.encode('utf-8'), _sign(payload, secret).encode('ascii')):
+            raise ValueError
+        claims = json.loads(_b64decode(payload))
+        user_id, username, expires = claims['sub'], claims['name'], float(claims['exp'])
+    except (ValueError, TypeError, KeyError):
+        # Covers UnicodeError, binascii.Error and JSONDecodeError, all ValueErrors
+        raise ValueError("Invalid token. Please log in again.") from None
+    if expires < time.time():
+        raise ValueError("Token expired. Please log in again.")
+    return user_id, username
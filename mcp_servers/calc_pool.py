@@ -0,0 +1,211 @@
+"""Worker processes for calculator expressions that may be expensive.
+
+Expressions with powers or combinatorics can still take seconds within the
+engine's limits, so they run in a small process pool instead of on the event
+loop shared by every mounted MCP app. Each worker has an address-space limit
+and a per-call CPU-time limit (a worker that exceeds either dies and the pool
+is rebuilt). Callers also get a wall-clock timeout, after which the workers
+are terminated so the CPU is freed immediately. Cheap expressions skip the
+pool entirely.
+
+    CALC_WORKERS=2            worker processes
+    CALC_TIMEOUT=2            seconds a calculation may take (wall clock)
+    CALC_MEMORY_LIMIT_MB=512  address space per worker
+    CALC_MAX_PENDING=32       calculations queued or running before new ones are refused
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from mcp_servers import expression_engine
+from mcp_servers.expression_engine import ExpressionError
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, the wall-clock timeout still applies
+    resource = None
+
+CALC_WORKERS = int(os.getenv('CALC_WORKERS', '2'))
+CALC_TIMEOUT = float(os.getenv('CALC_TIMEOUT', '2'))
+CALC_MEMORY_LIMIT_MB = int(os.getenv('CALC_MEMORY_LIMIT_MB', '512'))
+CALC_MAX_PENDING = int(os.getenv('CALC_MAX_PENDING', '32'))
+
+# Generous bound on starting the workers, which is not charged to any calculation
+WORKER_START_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(memory_limit_mb):
+    # One BLAS thread per worker; its per-thread buffers would eat into the address-space limit
+    os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run(cpu_seconds, fn_name, *args):
+    """Worker side: allow ``cpu_seconds`` more CPU time, then run the engine function"""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(used + cpu_seconds), hard))
+    return getattr(expression_engine, fn_name)(*args)
+
+
+def _mp_context():
+    # Workers must not be forked from the server (its threads, sockets and event loop).
+    # A fork server with the engine preloaded starts clean workers cheaply after a restart.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['mcp_servers.expression_engine'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class CalculatorPool:
+    """Bounded process pool with per-call timeouts, rebuilt whenever a worker is killed"""
+
+    def __init__(self, workers=CALC_WORKERS, timeout=CALC_TIMEOUT, memory_limit_mb=CALC_MEMORY_LIMIT_MB,
+                 max_pending=CALC_MAX_PENDING):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_pending = max_pending
+        self.pending = 0
+        self.stats = {'inline': 0, 'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0,
+                      'rejected': 0, 'restarts': 0}
+        self._executor = None
+        self._started = ()
+        self._lock = threading.Lock()
+        # At most one calculation per worker is submitted, so time spent waiting for a
+        # free worker is not charged against a call's timeout (one semaphore per event loop)
+        self._slots = weakref.WeakKeyDictionary()
+
+    def _get_executor(self):
+        """The current executor and the futures of its worker start-up pings"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=_mp_context(),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb,),
+                )
+                self._started = tuple(self._executor.submit(_ping) for _ in range(self.workers))
+            return self._executor, self._started
+
+    def start(self):
+        """Start the workers now and wait until they are up, instead of on the first expensive call"""
+        _, started = self._get_executor()
+        for future in started:
+            future.result(timeout=WORKER_START_TIMEOUT)
+
+    def _slot(self):
+        loop = asyncio.get_running_loop()
+        slot = self._slots.get(loop)
+        if slot is None:
+            slot = self._slots[loop] = asyncio.Semaphore(self.workers)
+        return slot
+
+    def _restart(self, executor, reason):
+        """Kill the workers of ``executor`` so the next call starts a fresh pool.
+
+        Returns False if another call already replaced it.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+            self.stats['restarts'] += 1
+        logger.warning(f"Restarting calculator workers: {reason}")
+        # ProcessPoolExecutor cannot cancel a running call; terminating its workers is the only way
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def _count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    async def run(self, fn_name, *args):
+        """Run ``expression_engine.<fn_name>(*args)`` in a worker, raising ExpressionError on limits"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise ExpressionError("Calculator is busy, try again shortly")
+            self.pending += 1
+            self.stats['submitted'] += 1
+        try:
+            async with self._slot():
+                # A call killed only because another call's timeout restarted the pool is retried once
+                for attempt in range(2):
+                    executor, started = self._get_executor()
+                    try:
+                        await asyncio.wait_for(asyncio.gather(*map(asyncio.wrap_future, started)), WORKER_START_TIMEOUT)
+                        future = executor.submit(_run, self.timeout, fn_name, *args)
+                        result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+                    except asyncio.TimeoutError:
+                        self._count('timeouts')
+                        self._restart(executor, f"calculation exceeded {self.timeout:g}s")
+                        raise ExpressionError(f"Calculation took longer than {self.timeout:g} seconds") from None
+                    except BrokenProcessPool:
+                        if attempt == 0 and not self._restart(executor, "a worker died"):
+                            continue
+                        self._count('failed')
+                        raise ExpressionError("Calculation exceeded its CPU or memory limit") from None
+                    except MemoryError:
+                        self._count('failed')
+                        raise ExpressionError("Calculation exceeded its memory limit") from None
+                    self._count('completed')
+                    return result
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def evaluate(self, expression, variables=None):
+        """Evaluate inline when the expression is cheap, otherwise in a worker"""
+        expression_engine.validate_variables(variables)
+        if not expression_engine.compile_expression(expression).expensive:
+            self._count('inline')
+            return expression_engine.evaluate(expression, variables)
+        return await self.run('evaluate', expression, variables)
+
+    async def evaluate_batch(self, expression, variables, reductions=()):
+        if not expression_engine.compile_expression(expression).expensive:
+            self._count('inline')
+            return expression_engine.evaluate_batch(expression, variables, reductions)
+        return await self.run('evaluate_batch', expression, variables, tuple(reductions))
+
+    def snapshot(self):
+        with self._lock:
+            busy = min(self.pending, self.workers)
+            return dict(self.stats,
+                        workers=self.workers,
+                        running=self._executor is not None,
+                        pending=self.pending,
+                        max_pending=self.max_pending,
+                        utilization=round(busy / self.workers, 3) if self.workers else None,
+                        timeout_seconds=self.timeout)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+pool = CalculatorPool()
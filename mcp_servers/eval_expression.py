@@ -2,22 +2,61 @@ from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 import datetime
 import pytz
+import logging
+from typing import Literal, Optional, Union
+from mcp_servers import expression_engine, json_codec, metrics
+from mcp_servers.calc_pool import pool as calc_pool
+from mcp_servers.instrumentation import instrument
 
 
+# Set up logging
+logging.basicConfig(level=logging.INFO)
 
-mcp = FastMCP("expression_evaluator")
+mcp = instrument(FastMCP("expression_evaluator"))
+metrics.register('calculator_cache', expression_engine.cache_stats)
+metrics.register('calculator_pool', calc_pool.snapshot)
+
+def warm_up():
+  """Start the calculator workers before the first expensive expression"""
+  calc_pool.start()
+
+def close():
+  """Stop the calculator workers (on server shutdown)"""
+  calc_pool.shutdown()
 
 
 @mcp.tool(
   name = 'calculator',
-  description= "Tool to evaluate mathemetical expressions"
+  description= "Tool to evaluate mathemetical expressions. Supports + - * / // % **, "
+               "math functions (sqrt, log, sin, factorial, ...), pi/e and named variables"
 )
-def evaluate_expression(math_exp : str) -> float:
+async def evaluate_expression(
+  math_exp : str,
+  variables: Optional[dict[str, float]] = Field(None, description="Values for names used in the expression, e.g. {\"x\": 2}")
+) -> Union[int, float]:
   """ Evaluate given mathematics expression and returns the result"""
   
   if not math_exp:
     raise ValueError(f"Provide any expression to evaluate")
-  return eval(math_exp)
+  return await calc_pool.evaluate(math_exp, variables)
+
+@mcp.tool(
+  name='calculate_batch',
+  description="Evaluate one expression over many values at once, e.g. tax or tip for every expense. "
+              "variables maps each name to a list of numbers (all the same length) or a single number; "
+              "returns JSON with one result per row and optional sum/mean/min/max"
+)
+async def calculate_batch(
+  expression: str,
+  variables: dict[str, Union[list[float], float]] = Field(description="Values per name, e.g. {\"amount\": [12.5, 40], \"rate\": 0.18}"),
+  reductions: Optional[list[Literal['sum', 'mean', 'min', 'max']]] = Field(None, description="Aggregates of the results to include")
+) -> str:
+  """Compile the expression once and evaluate it vectorized with NumPy"""
+  
+  if not expression:
+    raise ValueError(f"Provide any expression to evaluate")
+  result = await calc_pool.evaluate_batch(expression, variables, reductions or ())
+  return json_codec.dumps(result)
 
 @mcp.tool(
   name='date_time',
@@ -0,0 +1,171 @@
+"""Expense totals exposed as calculator variables.
+
+A variable name describes an aggregate over the logged-in user's expenses:
+
+    [measure_][category_]period
+
+- period: ``2024_05`` (a month), ``2024`` (a year) or ``30d`` (the last 30
+  days including today)
+- category: a category name in lower case with spaces as underscores
+  (``food``, ``eating_out``); ``total`` or nothing means all categories
+- measure: nothing for the amount spent, ``count`` for the number of
+  expenses, ``avg`` for the average expense, ``avg_daily`` for the amount
+  per calendar day of the period
+
+e.g. ``food_2024_05``, ``total_2024``, ``avg_daily_30d``, ``count_transport_7d``.
+
+Each distinct period costs one aggregation (grouped by category, served by
+the user_date index) whose result is cached per user until it expires or the
+user changes an expense. The cache is per process: with several workers, a
+write invalidates only the worker that handled it, so the others may serve
+the old totals for up to EXPENSE_AGGREGATE_TTL (scripts/serve.py lowers it).
+
+    EXPENSE_AGGREGATE_TTL=300            seconds an aggregation result is reused
+    EXPENSE_AGGREGATE_MAX_ENTRIES=10000  cached results kept (least recently used go first)
+"""
+import calendar
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from mcp_servers.expression_engine import ExpressionError
+
+EXPENSE_AGGREGATE_TTL = int(os.getenv('EXPENSE_AGGREGATE_TTL', '300'))
+EXPENSE_AGGREGATE_MAX_ENTRIES = int(os.getenv('EXPENSE_AGGREGATE_MAX_ENTRIES', '10000'))
+
+SYMBOL_PATTERN = re.compile(
+    r'^(?:(?P<measure>avg_daily|count|avg)_)?(?:(?P<category>[a-z][a-z0-9_]*?)_)?'
+    r'(?:(?P<year>\d{4})(?:_(?P<month>\d{2}))?|(?P<days>\d+)d)$'
+)
+
+MAX_ROLLING_DAYS = 3660
+
+
+def category_key(category):
+    """How a stored category is spelled in variable names: 'Eating Out' -> 'eating_out'"""
+    return re.sub(r'[^a-z0-9]+', '_', str(category).lower()).strip('_')
+
+
+def parse_symbol(name, now=None):
+    """(measure, category key or None, start, end, days) for a variable name"""
+    match = SYMBOL_PATTERN.match(name)
+    if not match:
+        raise ExpressionError(
+            f"Unknown variable '{name}'. Use [count_|avg_|avg_daily_][category_]period with period "
+            f"YYYY_MM, YYYY or <N>d, e.g. food_2024_05, total_2024, avg_daily_30d"
+        )
+    now = now or datetime.now()
+    category = match['category']
+    if category == 'total':
+        category = None
+
+    if match['days']:
+        days = int(match['days'])
+        if not 1 <= days <= MAX_ROLLING_DAYS:
+            raise ExpressionError(f"'{name}': the number of days must be between 1 and {MAX_ROLLING_DAYS}")
+        end = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        start = end - timedelta(days=days)
+    else:
+        year = int(match['year'])
+        if not 1900 <= year < 9999:
+            raise ExpressionError(f"'{name}': year {year} is out of range")
+        if match['month']:
+            month = int(match['month'])
+            if not 1 <= month <= 12:
+                raise ExpressionError(f"'{name}': month {month} is out of range")
+            start = datetime(year, month, 1)
+            end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+            days = calendar.monthrange(year, month)[1]
+        else:
+            start = datetime(year, 1, 1)
+            end = datetime(year + 1, 1, 1)
+            days = (end - start).days
+    return match['measure'] or 'sum', category, start, end, days
+
+
+class AggregateCache:
+    """Per-user category totals by period, reused until they expire or the user writes"""
+
+    def __init__(self, ttl=EXPENSE_AGGREGATE_TTL, max_entries=EXPENSE_AGGREGATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Least recently used first
+        self._entries = OrderedDict()
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def totals(self, db, user_id, start, end):
+        """{category key: (amount, count)} for the user's expenses with start <= date < end"""
+        key = (user_id, start, end)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        totals = {}
+        for row in db.expenses.aggregate([
+            {'$match': {'user_id': user_id, 'date': {'$gte': start, '$lt': end}}},
+            {'$group': {'_id': '$category', 'amount': {'$sum': '$amount'}, 'count': {'$sum': 1}}},
+        ]):
+            amount, count = totals.get(category_key(row['_id']), (0, 0))
+            totals[category_key(row['_id'])] = (amount + row['amount'], count + row['count'])
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, totals)
+            self._entries.move_to_end(key)
+            self._prune(now)
+        return totals
+
+    def _prune(self, now):
+        # Expired entries go in a full sweep at most once per TTL, the rest by LRU above the cap
+        if now >= self._next_sweep:
+            for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[key]
+            self._next_sweep = now + self.ttl
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        """Forget every cached aggregate of user_id (call after any write to their expenses)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+            self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries, ttl_seconds=self.ttl)
+
+
+cache = AggregateCache()
+
+
+def resolve(db, user_id, names):
+    """Values for the aggregate variable names used by an expression"""
+    values = {}
+    for name in names:
+        measure, category, start, end, days = parse_symbol(name)
+        totals = cache.totals(db, user_id, start, end)
+        if category is None:
+            amount = sum(amount for amount, _ in totals.values())
+            count = sum(count for _, count in totals.values())
+        else:
+            amount, count = totals.get(category, (0, 0))
+        if measure == 'count':
+            values[name] = count
+        elif measure == 'avg':
+            values[name] = round(amount / count, 2) if count else 0.0
+        elif measure == 'avg_daily':
+            values[name] = round(amount / days, 2)
+        else:
+            values[name] = round(amount, 2)
+    return values
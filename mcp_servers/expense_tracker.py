@@ -2,47 +2,183 @@ from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 import typing
 from datetime import datetime, timedelta
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel
 from bson.objectid import ObjectId
 import re
 from collections import defaultdict
+import asyncio
+import functools
 import hashlib
-import json
 from typing import Optional
 import os
+import logging
+import threading
 from dotenv import load_dotenv
+from mcp_servers import access_log, auth_tokens, calc_pool, expense_aggregates, json_codec, metrics, rate_limit
+from mcp_servers.expression_engine import ExpressionError, compile_expression
+from mcp_servers.instrumentation import instrument
+from mcp_servers.tracing import span
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # Get MongoDB connection string from environment variable
+# Checked when the first client is created, so the module (and its tool list) loads without it
 MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise ValueError("MONGO_URI environment variable is not set. Please configure it in .env file or deployment environment.")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "expenses")
 
 # Create FastMCP instance
 
 PORT = os.environ.get("PORT",8000)
-mcp = FastMCP("expense-tracker")
 
-# User authentication helpers
+# Rate-limit cost of each tool (others cost 1). The heavy ones read a user's whole
+# history, so they also share HEAVY_QUERY_CONCURRENCY slots and run off the event loop
+HEAVY_TOOLS = ['get_my_expenses', 'get_my_expenses_by_category', 'get_my_expense_summary',
+               'find_my_expenses', 'get_my_spending_trends']
+TOOL_COSTS = {
+    **dict.fromkeys(HEAVY_TOOLS, 5),
+    **dict.fromkeys(['get_my_monthly_report', 'get_my_week_summary', 'set_my_budget_alert',
+                     'calculate_with_my_expenses'], 2),
+}
+# Password guesses are limited per client address, whoever is logged in
+RATE_LIMIT_LOGIN_BURST = float(os.getenv("RATE_LIMIT_LOGIN_BURST", "5"))
+RATE_LIMIT_LOGIN_PER_MINUTE = float(os.getenv("RATE_LIMIT_LOGIN_PER_MINUTE", "2"))
+LOGIN_TOOLS = ['login', 'register']
+limiter = rate_limit.Limiter(
+    TOOL_COSTS, HEAVY_TOOLS,
+    tool_limits=dict.fromkeys(LOGIN_TOOLS, (RATE_LIMIT_LOGIN_BURST, RATE_LIMIT_LOGIN_PER_MINUTE / 60)),
+    by_address=LOGIN_TOOLS,
+)
+mcp = instrument(FastMCP("expense-tracker"), current_user=lambda: logged_in_user_id(), limiter=limiter)
+
+# Signs the bearer tokens returned by login. When set, every request authenticates
+# with "Authorization: Bearer <token>" and no login state is kept in the process,
+# so any worker or replica can serve any request
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET")
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", "86400"))
+
+# User authentication helpers (single-process mode, without AUTH_TOKEN_SECRET)
 current_user_id = None
 current_username = None
 
+# Indexes backing the query shapes used by the tools below. Every expense query
+# filters on user_id first, then either sorts/ranges on date or also filters on
+# category. Keep scripts/check_query_plans.py green when changing a query.
+EXPENSE_INDEXES = [
+    IndexModel([('user_id', ASCENDING), ('date', DESCENDING)], name='user_date'),
+    IndexModel([('user_id', ASCENDING), ('category', ASCENDING), ('date', DESCENDING)], name='user_category_date'),
+]
+USER_INDEXES = [
+    IndexModel([('username', ASCENDING)], name='username'),
+]
+
+# One pooled client per process, shared by every tool call (MongoClient is thread-safe)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+_client = None
+_client_lock = threading.Lock()
+
+def ensure_indexes(db):
+    """Create the indexes the tools rely on (no-op if they already exist)"""
+    db.expenses.create_indexes(EXPENSE_INDEXES)
+    db.users.create_indexes(USER_INDEXES)
+
 def get_mongo_client():
-    """Get MongoDB client connection"""
-    return MongoClient(MONGO_URI)
+    """Get the shared MongoDB client, creating it (and the indexes) on first use"""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            if not MONGO_URI:
+                raise ValueError("MONGO_URI environment variable is not set. Please configure it in .env file or deployment environment.")
+            client = MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
+            try:
+                ensure_indexes(client[MONGO_DB_NAME])
+            except Exception:
+                client.close()
+                raise
+            logger.info(f"Ensured indexes on {MONGO_DB_NAME}.expenses and {MONGO_DB_NAME}.users")
+            _client = client
+    return _client
+
+def close():
+    """Close the shared MongoDB client (on server shutdown)"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+def warm_up():
+    """Connect to MongoDB, ensure indexes and compile the categorizer before the first call"""
+    client = get_mongo_client()
+    client.admin.command('ping')
+    category_patterns()
+
+access_log.set_explain_client(get_mongo_client)
+metrics.register('expense_aggregates', expense_aggregates.cache.snapshot)
+metrics.register('rate_limit', limiter.snapshot)
 
 def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+def bearer_token():
+    """Token from the Authorization header of the request being handled, if any"""
+    try:
+        request = mcp.get_context().request_context.request
+    except (LookupError, ValueError):
+        return None
+    if request is None:
+        return None
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+def current_user():
+    """(user_id, username) of the caller, or None if not logged in"""
+    if not AUTH_TOKEN_SECRET:
+        return (current_user_id, current_username) if current_user_id else None
+    token = bearer_token()
+    if token is None:
+        return None
+    return auth_tokens.verify(token, AUTH_TOKEN_SECRET)
+
+def logged_in_user_id():
+    """The caller's user id for the access log (None when not or invalidly authenticated)"""
+    try:
+        user = current_user()
+    except Exception:
+        return None
+    return user[0] if user else None
+
+def format_duration(seconds: int) -> str:
+    """Human readable duration, e.g. '1 d', '1 h 30 min', '45 s'"""
+    parts = []
+    for unit, size in (('d', 86400), ('h', 3600), ('min', 60), ('s', 1)):
+        if seconds >= size:
+            value, seconds = divmod(seconds, size)
+            parts.append(f"{value} {unit}")
+    return ' '.join(parts) or '0 s'
+
 def require_auth():
     """Check if user is authenticated"""
-    global current_user_id
-    if not current_user_id:
-        raise Exception("Please log in first using the 'login' or 'register' tool.")
-    return current_user_id
+    with span('auth'):
+        user = current_user()
+        if not user:
+            if AUTH_TOKEN_SECRET:
+                raise Exception("Please log in first using the 'login' tool and send the token it returns "
+                                "as 'Authorization: Bearer <token>'.")
+            raise Exception("Please log in first using the 'login' or 'register' tool.")
+        return user[0]
+
+def to_json(data) -> str:
+    """Serialize a tool result to compact JSON (indented with JSON_PRETTY=1)"""
+    with span('serialize'):
+        return json_codec.dumps(data)
 
 @mcp.tool(
     name='register',
@@ -50,13 +186,11 @@ def require_auth():
 )
 def register(username: str, password: str) -> str:
     client = get_mongo_client()
-    db = client.expenses
+    db = client[MONGO_DB_NAME]
     if db.users.find_one({'username': username}):
-        client.close()
         return "Username already exists. Please choose another."
     hashed = hash_password(password)
     result = db.users.insert_one({'username': username, 'password': hashed})
-    client.close()
     return f"User '{username}' registered successfully. Please log in."
 
 @mcp.tool(
@@ -66,11 +200,14 @@ def register(username: str, password: str) -> str:
 def login(username: str, password: str) -> str:
     global current_user_id, current_username
     client = get_mongo_client()
-    db = client.expenses
+    db = client[MONGO_DB_NAME]
     user = db.users.find_one({'username': username})
-    client.close()
     if not user or user['password'] != hash_password(password):
         return "Invalid username or password."
+    if AUTH_TOKEN_SECRET:
+        token = auth_tokens.issue(str(user['_id']), username, AUTH_TOKEN_SECRET, AUTH_TOKEN_TTL)
+        return (f"Logged in as {username}. Send this token as 'Authorization: Bearer <token>' "
+                f"with every request (valid for {format_duration(AUTH_TOKEN_TTL)}):\n{token}")
     current_user_id = str(user['_id'])
     current_username = username
     return f"Logged in as {username}."
@@ -81,6 +218,8 @@ def login(username: str, password: str) -> str:
 )
 def logout() -> str:
     global current_user_id, current_username
+    if AUTH_TOKEN_SECRET:
+        return "Logged out. Stop sending your token; it cannot be used after it expires."
     current_user_id = None
     current_username = None
     return "Logged out."
@@ -99,7 +238,7 @@ def add_expense(
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Parse date
         expense_date = datetime.strptime(date, '%Y-%m-%d')
@@ -114,9 +253,9 @@ def add_expense(
         }
         
         result = db.expenses.insert_one(expense_data)
-        client.close()
+        expense_aggregates.cache.invalidate(user_id)
         
-        return f"Expense added for {current_username} with ID: {str(result.inserted_id)}"
+        return f"Expense added for {current_user()[1]} with ID: {str(result.inserted_id)}"
     except Exception as e:
         return f"Error adding expense: {str(e)}"
 
@@ -129,10 +268,9 @@ def get_my_expenses() -> str:
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expenses = list(db.expenses.find({'user_id': user_id}).sort("date", -1))
-        client.close()
         
         if not expenses:
             return "No expenses found."
@@ -147,7 +285,7 @@ def get_my_expenses() -> str:
                 'description': expense['description']
             })
         
-        return json.dumps(result, indent=2)
+        return to_json(result)
     except Exception as e:
         return f"Error retrieving expenses: {str(e)}"
 
@@ -160,10 +298,9 @@ def get_my_expense_by_id(expense_id: str = Field(description="The MongoDB Object
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expense = db.expenses.find_one({'_id': ObjectId(expense_id), 'user_id': user_id})
-        client.close()
         
         if not expense:
             return f"No expense found with ID: {expense_id} for this user."
@@ -176,7 +313,7 @@ def get_my_expense_by_id(expense_id: str = Field(description="The MongoDB Object
             'description': expense['description']
         }
         
-        return json.dumps(result, indent=2)
+        return to_json(result)
     except Exception as e:
         return f"Error retrieving expense: {str(e)}"
 
@@ -195,7 +332,7 @@ def update_my_expense(
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Build update data
         update_data = {}
@@ -215,7 +352,7 @@ def update_my_expense(
             {'_id': ObjectId(expense_id), 'user_id': user_id},
             {'$set': update_data}
         )
-        client.close()
+        expense_aggregates.cache.invalidate(user_id)
         
         if result.matched_count == 0:
             return f"No expense found with ID: {expense_id} for this user."
@@ -233,10 +370,10 @@ def delete_my_expense(expense_id: str = Field(description="The MongoDB ObjectId
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         result = db.expenses.delete_one({'_id': ObjectId(expense_id), 'user_id': user_id})
-        client.close()
+        expense_aggregates.cache.invalidate(user_id)
         
         if result.deleted_count == 0:
             return f"No expense found with ID: {expense_id} for this user."
@@ -254,10 +391,9 @@ def get_my_expenses_by_category(category: str = Field(description="Category to f
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expenses = list(db.expenses.find({'user_id': user_id, 'category': category}).sort("date", -1))
-        client.close()
         
         if not expenses:
             return f"No expenses found for category: {category}."
@@ -274,12 +410,12 @@ def get_my_expenses_by_category(category: str = Field(description="Category to f
             })
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'category': category,
             'total_expenses': len(result),
             'total_amount': total_amount,
             'expenses': result
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error retrieving expenses by category: {str(e)}"
 
@@ -292,7 +428,7 @@ def get_my_monthly_report(year: int = Field(description="Year (e.g., 2024)"), mo
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Create date range for the month
         start_date = datetime(year, month, 1)
@@ -305,7 +441,6 @@ def get_my_monthly_report(year: int = Field(description="Year (e.g., 2024)"), mo
             'user_id': user_id,
             'date': {'$gte': start_date, '$lt': end_date}
         }).sort("date", -1))
-        client.close()
         
         if not expenses:
             return f"No expenses found for {year}-{month:02d}."
@@ -328,13 +463,13 @@ def get_my_monthly_report(year: int = Field(description="Year (e.g., 2024)"), mo
             category_totals[category] = category_totals.get(category, 0) + expense['amount']
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'period': f"{year}-{month:02d}",
             'total_expenses': len(result),
             'total_amount': total_amount,
             'category_breakdown': category_totals,
             'expenses': result
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error generating monthly report: {str(e)}"
 
@@ -347,7 +482,7 @@ def get_my_expense_summary() -> str:
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Aggregate expenses by category
         pipeline = [
@@ -370,7 +505,6 @@ def get_my_expense_summary() -> str:
         total_expenses = db.expenses.count_documents({'user_id': user_id})
         total_amount = sum(cat['total_amount'] for cat in category_summary)
         
-        client.close()
         
         result = {
             'total_expenses': total_expenses,
@@ -386,10 +520,34 @@ def get_my_expense_summary() -> str:
             ]
         }
         
-        return json.dumps(result, indent=2)
+        return to_json(result)
     except Exception as e:
         return f"Error generating expense summary: {str(e)}"
 
+# Keyword rules for quick_add_expense, checked in order; the first match wins
+CATEGORY_KEYWORDS = [
+    ('Food', ['coffee', 'lunch', 'dinner', 'food', 'restaurant', 'eat', 'pizza', 'burger']),
+    ('Transport', ['uber', 'taxi', 'gas', 'fuel', 'parking', 'bus', 'train', 'transport']),
+    ('Entertainment', ['movie', 'cinema', 'game', 'entertainment', 'concert', 'show']),
+    ('Groceries', ['grocery', 'supermarket', 'shopping', 'store', 'market']),
+    ('Bills', ['bill', 'electric', 'water', 'internet', 'phone', 'utility']),
+    ('Health', ['medicine', 'doctor', 'hospital', 'pharmacy', 'health']),
+]
+
+@functools.cache
+def category_patterns():
+    """One compiled alternation per category in CATEGORY_KEYWORDS"""
+    return [(category, re.compile('|'.join(map(re.escape, words))))
+            for category, words in CATEGORY_KEYWORDS]
+
+def categorize(description: str) -> str:
+    """Category of the first rule with a keyword in description, else 'Other'"""
+    description_lower = description.lower()
+    for category, pattern in category_patterns():
+        if pattern.search(description_lower):
+            return category
+    return 'Other'
+
 @mcp.tool(
     name='quick_add_expense',
     description="Quickly add an expense with today's date using natural language like 'lunch $15' or 'gas 45.50'"
@@ -410,22 +568,7 @@ def quick_add_expense(expense_text: str = Field(description="Natural language ex
         if not description:
             description = f"Expense for ${amount}"
         
-        # Smart category detection based on keywords
-        description_lower = description.lower()
-        if any(word in description_lower for word in ['coffee', 'lunch', 'dinner', 'food', 'restaurant', 'eat', 'pizza', 'burger']):
-            category = 'Food'
-        elif any(word in description_lower for word in ['uber', 'taxi', 'gas', 'fuel', 'parking', 'bus', 'train', 'transport']):
-            category = 'Transport'
-        elif any(word in description_lower for word in ['movie', 'cinema', 'game', 'entertainment', 'concert', 'show']):
-            category = 'Entertainment'
-        elif any(word in description_lower for word in ['grocery', 'supermarket', 'shopping', 'store', 'market']):
-            category = 'Groceries'
-        elif any(word in description_lower for word in ['bill', 'electric', 'water', 'internet', 'phone', 'utility']):
-            category = 'Bills'
-        elif any(word in description_lower for word in ['medicine', 'doctor', 'hospital', 'pharmacy', 'health']):
-            category = 'Health'
-        else:
-            category = 'Other'
+        category = categorize(description)
         
         # Use today's date
         today = datetime.now().strftime('%Y-%m-%d')
@@ -446,13 +589,12 @@ def get_my_today_expenses() -> str:
         tomorrow = today + timedelta(days=1)
         
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expenses = list(db.expenses.find({
             'user_id': user_id,
             'date': {'$gte': today, '$lt': tomorrow}
         }).sort("date", -1))
-        client.close()
         
         if not expenses:
             return "No expenses recorded for today."
@@ -469,12 +611,12 @@ def get_my_today_expenses() -> str:
             })
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'date': today.strftime('%Y-%m-%d'),
             'total_expenses': len(result),
             'total_amount': total_amount,
             'expenses': result
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error retrieving today's expenses: {str(e)}"
 
@@ -492,13 +634,12 @@ def get_my_week_summary() -> str:
         week_end = week_start + timedelta(days=7)
         
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expenses = list(db.expenses.find({
             'user_id': user_id,
             'date': {'$gte': week_start, '$lt': week_end}
         }))
-        client.close()
         
         if not expenses:
             return f"No expenses found for this week ({week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')})"
@@ -514,13 +655,13 @@ def get_my_week_summary() -> str:
             category_totals[expense['category']] += expense['amount']
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'week_period': f"{week_start.strftime('%Y-%m-%d')} to {(week_end - timedelta(days=1)).strftime('%Y-%m-%d')}",
             'total_amount': total_amount,
             'daily_breakdown': dict(daily_totals),
             'category_breakdown': dict(category_totals),
             'average_per_day': round(total_amount / 7, 2)
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error generating week summary: {str(e)}"
 
@@ -538,7 +679,7 @@ def find_my_expenses(
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Build search query
         query = {'user_id': user_id}
@@ -562,7 +703,6 @@ def find_my_expenses(
             query['date'] = {'$gte': cutoff_date}
         
         expenses = list(db.expenses.find(query).sort("date", -1))
-        client.close()
         
         if not expenses:
             return "No expenses found matching your criteria."
@@ -579,7 +719,7 @@ def find_my_expenses(
             })
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'search_criteria': {
                 'search_term': search_term,
                 'min_amount': min_amount,
@@ -589,7 +729,7 @@ def find_my_expenses(
             'total_found': len(result),
             'total_amount': total_amount,
             'expenses': result
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error searching expenses: {str(e)}"
 
@@ -602,7 +742,7 @@ def get_my_spending_trends() -> str:
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Get last 30 days of data
         thirty_days_ago = datetime.now() - timedelta(days=30)
@@ -614,41 +754,41 @@ def get_my_spending_trends() -> str:
         if not expenses:
             return "Not enough data for trend analysis (need at least 30 days of expenses)"
         
-        # Analyze by week
-        weekly_spending = defaultdict(float)
-        category_trends = defaultdict(list)
-        daily_spending = defaultdict(float)
+        with span('postprocess', expenses=len(expenses)):
+            # Analyze by week
+            weekly_spending = defaultdict(float)
+            category_trends = defaultdict(list)
+            daily_spending = defaultdict(float)
         
-        for expense in expenses:
-            week = expense['date'].strftime('%Y-W%U')
-            day = expense['date'].strftime('%Y-%m-%d')
+            for expense in expenses:
+                week = expense['date'].strftime('%Y-W%U')
+                day = expense['date'].strftime('%Y-%m-%d')
             
-            weekly_spending[week] += expense['amount']
-            daily_spending[day] += expense['amount']
-            category_trends[expense['category']].append(expense['amount'])
-        
-        # Calculate averages and trends
-        weekly_amounts = list(weekly_spending.values())
-        daily_amounts = list(daily_spending.values())
-        
-        avg_weekly = sum(weekly_amounts) / len(weekly_amounts) if weekly_amounts else 0
-        avg_daily = sum(daily_amounts) / len(daily_amounts) if daily_amounts else 0
-        
-        # Top spending categories
-        category_totals = {}
-        for category, amounts in category_trends.items():
-            category_totals[category] = {
-                'total': sum(amounts),
-                'average_per_expense': sum(amounts) / len(amounts),
-                'count': len(amounts)
-            }
+                weekly_spending[week] += expense['amount']
+                daily_spending[day] += expense['amount']
+                category_trends[expense['category']].append(expense['amount'])
+        
+            # Calculate averages and trends
+            weekly_amounts = list(weekly_spending.values())
+            daily_amounts = list(daily_spending.values())
+        
+            avg_weekly = sum(weekly_amounts) / len(weekly_amounts) if weekly_amounts else 0
+            avg_daily = sum(daily_amounts) / len(daily_amounts) if daily_amounts else 0
+        
+            # Top spending categories
+            category_totals = {}
+            for category, amounts in category_trends.items():
+                category_totals[category] = {
+                    'total': sum(amounts),
+                    'average_per_expense': sum(amounts) / len(amounts),
+                    'count': len(amounts)
+                }
         
-        # Sort categories by total spending
-        top_categories = sorted(category_totals.items(), key=lambda x: x[1]['total'], reverse=True)
+            # Sort categories by total spending
+            top_categories = sorted(category_totals.items(), key=lambda x: x[1]['total'], reverse=True)
         
-        client.close()
         
-        return json.dumps({
+        return to_json({
             'analysis_period': '30 days',
             'daily_average': round(avg_daily, 2),
             'weekly_average': round(avg_weekly, 2),
@@ -663,7 +803,7 @@ def get_my_spending_trends() -> str:
                 for cat in top_categories[:5]
             ],
             'weekly_breakdown': dict(weekly_spending)
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error analyzing spending trends: {str(e)}"
 
@@ -680,7 +820,7 @@ def set_my_budget_alert(
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Calculate date range based on period
         now = datetime.now()
@@ -702,7 +842,6 @@ def set_my_budget_alert(
             'category': category,
             'date': {'$gte': start_date}
         }))
-        client.close()
         
         total_spent = sum(expense['amount'] for expense in expenses)
         remaining_budget = budget_amount - total_spent
@@ -716,7 +855,7 @@ def set_my_budget_alert(
         elif percentage_used >= 60:
             status = "CAUTION - 60% used"
         
-        return json.dumps({
+        return to_json({
             'category': category,
             'period': period,
             'budget_limit': budget_amount,
@@ -726,7 +865,7 @@ def set_my_budget_alert(
             'status': status,
             'days_in_period': (now - start_date).days + 1,
             'expense_count': len(expenses)
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error checking budget: {str(e)}"
 
@@ -742,10 +881,9 @@ def get_my_recent_expenses(limit: int = Field(default=5, description="Number of
             return "Limit must be between 1 and 20"
         
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         expenses = list(db.expenses.find({'user_id': user_id}).sort("date", -1).limit(limit))
-        client.close()
         
         if not expenses:
             return "No expenses found."
@@ -762,11 +900,11 @@ def get_my_recent_expenses(limit: int = Field(default=5, description="Number of
             })
             total_amount += expense['amount']
         
-        return json.dumps({
+        return to_json({
             'recent_expenses_count': len(result),
             'total_amount_recent': total_amount,
             'expenses': result
-        }, indent=2)
+        })
     except Exception as e:
         return f"Error retrieving recent expenses: {str(e)}"
 
@@ -783,12 +921,11 @@ def duplicate_my_expense(
     user_id = require_auth()
     try:
         client = get_mongo_client()
-        db = client.expenses
+        db = client[MONGO_DB_NAME]
         
         # Get original expense
         original = db.expenses.find_one({'_id': ObjectId(expense_id), 'user_id': user_id})
         if not original:
-            client.close()
             return f"No expense found with ID: {expense_id} for this user."
         
         # Create new expense data
@@ -801,12 +938,40 @@ def duplicate_my_expense(
         }
         
         result = db.expenses.insert_one(new_expense)
-        client.close()
+        expense_aggregates.cache.invalidate(user_id)
         
         return f"Expense duplicated successfully with new ID: {str(result.inserted_id)}"
     except Exception as e:
         return f"Error duplicating expense: {str(e)}"
 
+@mcp.tool(
+    name='calculate_with_my_expenses',
+    description="Evaluate a calculator expression whose variables are your expense totals, "
+                "e.g. 'food_2024_05 * 1.18' or 'avg_daily_30d * 30'. Variables are "
+                "[count_|avg_|avg_daily_][category_]period with period YYYY_MM, YYYY or <N>d"
+)
+async def calculate_with_my_expenses(
+    expression: str = Field(description="Expression using expense variables like food_2024_05, total_2024, avg_daily_30d")
+) -> str:
+    """Evaluate an expression over the logged-in user's expense aggregates"""
+    user_id = require_auth()
+    try:
+        variables = compile_expression(expression).variables
+        # pymongo blocks, so the aggregations run in a worker thread
+        values = await asyncio.to_thread(
+            lambda: expense_aggregates.resolve(get_mongo_client()[MONGO_DB_NAME], user_id, variables))
+
+        result = await calc_pool.pool.evaluate(expression, values)
+        return to_json({
+            'expression': expression,
+            'result': result,
+            'variables': values
+        })
+    except ExpressionError as e:
+        return f"Error: {str(e)}"
+    except Exception as e:
+        return f"Error calculating with expenses: {str(e)}"
+
 if __name__ == "__main__":
     # Get port from environment variable (Render sets PORT automatically)
     mcp.run(transport='http')
@@ -0,0 +1,407 @@
+"""Safe arithmetic expression evaluation for the calculator tools.
+
+Expressions are parsed with ``ast``, checked against a whitelist (numbers,
+arithmetic operators, whitelisted math functions and constants, and caller
+supplied variables) and rewritten so every operator goes through a checked
+helper that refuses huge exponents and operands before doing the work. The
+result is compiled once and kept in an LRU cache, so evaluating a repeated
+or templated expression only runs the cached code object.
+
+    CALC_MAX_EXPRESSION_LENGTH=1000   characters accepted per expression
+    CALC_MAX_EXPONENT=10000           largest allowed |exponent| in a ** b
+    CALC_MAX_INT_BITS=4096            largest integer result, in bits
+    CALC_MAX_FACTORIAL=1000           largest n for factorial / comb / perm
+                                      (factorial and perm are also held to results
+                                      that fit in CALC_MAX_INT_BITS)
+    CALC_CACHE_SIZE=512               compiled expressions kept
+    CALC_BATCH_MAX_ROWS=100000        values per variable in evaluate_batch()
+
+``evaluate_batch`` runs the same compiled code over whole arrays by swapping
+the helpers for NumPy ufuncs (NumPy is imported on first use).
+"""
+import ast
+import functools
+import math
+import operator
+import os
+from functools import lru_cache
+
+CALC_MAX_EXPRESSION_LENGTH = int(os.getenv('CALC_MAX_EXPRESSION_LENGTH', '1000'))
+CALC_MAX_EXPONENT = int(os.getenv('CALC_MAX_EXPONENT', '10000'))
+CALC_MAX_INT_BITS = int(os.getenv('CALC_MAX_INT_BITS', '4096'))
+CALC_MAX_FACTORIAL = int(os.getenv('CALC_MAX_FACTORIAL', '1000'))
+CALC_CACHE_SIZE = int(os.getenv('CALC_CACHE_SIZE', '512'))
+CALC_BATCH_MAX_ROWS = int(os.getenv('CALC_BATCH_MAX_ROWS', '100000'))
+
+# Deepest nesting accepted, keeps the parser and compiler away from recursion limits
+MAX_DEPTH = 50
+
+
+class ExpressionError(ValueError):
+    """The expression is invalid, not allowed or exceeds a limit"""
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > CALC_MAX_INT_BITS:
+        raise ExpressionError(f"Result exceeds {CALC_MAX_INT_BITS} bits")
+    return value
+
+
+def _bits(value):
+    """Approximate size in bits of a number's integer part"""
+    if isinstance(value, int):
+        return value.bit_length()
+    if isinstance(value, float) and math.isfinite(value) and value != 0:
+        return max(math.frexp(value)[1], 0)
+    return 0
+
+
+def checked_pow(base, exponent):
+    if isinstance(exponent, (int, float)) and abs(exponent) > CALC_MAX_EXPONENT:
+        raise ExpressionError(f"Exponent {exponent} exceeds the limit of {CALC_MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # Refuse before computing: the result has about bits(base) * exponent bits
+        if max(base.bit_length() - 1, 0) * exponent > CALC_MAX_INT_BITS:
+            raise ExpressionError(f"Result exceeds {CALC_MAX_INT_BITS} bits")
+    return _check_int(base ** exponent)
+
+
+def checked_mul(a, b):
+    if isinstance(a, int) and isinstance(b, int) and _bits(a) + _bits(b) > CALC_MAX_INT_BITS + 1:
+        raise ExpressionError(f"Result exceeds {CALC_MAX_INT_BITS} bits")
+    return a * b
+
+
+def _largest_factorial(max_bits):
+    """Largest n whose factorial has at most ``max_bits`` bits"""
+    n, value = 0, 1
+    while (value * (n + 1)).bit_length() <= max_bits:
+        n += 1
+        value *= n
+    return n
+
+
+# factorial(n) and perm(n, k) are at most n!, so refuse n beyond this before computing.
+# comb(n, k) is below 2**n.
+MAX_FACTORIAL_N = min(CALC_MAX_FACTORIAL, _largest_factorial(CALC_MAX_INT_BITS))
+MAX_COMB_N = min(CALC_MAX_FACTORIAL, CALC_MAX_INT_BITS)
+
+
+def checked_factorial(n):
+    if not isinstance(n, int) or n < 0:
+        raise ExpressionError("factorial() needs a non-negative integer")
+    if n > MAX_FACTORIAL_N:
+        raise ExpressionError(f"factorial() is limited to n <= {MAX_FACTORIAL_N}")
+    return _check_int(math.factorial(n))
+
+
+def _checked_combinatoric(fn, max_n):
+    def checked(n, k=None):
+        if isinstance(n, int) and n > max_n:
+            raise ExpressionError(f"{fn.__name__}() is limited to n <= {max_n}")
+        return _check_int(fn(n) if k is None else fn(n, k))
+    return checked
+
+
+def checked_lcm(*values):
+    return _check_int(math.lcm(*values))
+
+
+# round(x, n) with a very negative n builds 10**-n, so n is clamped. Digits beyond
+# this change nothing for integers within CALC_MAX_INT_BITS or for any float.
+MAX_ROUND_DIGITS = max(int(CALC_MAX_INT_BITS * math.log10(2)) + 2, 400)
+
+
+def checked_round(x, ndigits=None):
+    if ndigits is None:
+        return round(x)
+    if not isinstance(ndigits, int):
+        raise ExpressionError("round() needs an integer number of digits")
+    return round(x, max(-MAX_ROUND_DIGITS, min(ndigits, MAX_ROUND_DIGITS)))
+
+
+BINARY_OPERATORS = {
+    ast.Add: ('_add', operator.add),
+    ast.Sub: ('_sub', operator.sub),
+    ast.Mult: ('_mul', checked_mul),
+    ast.Div: ('_div', operator.truediv),
+    ast.FloorDiv: ('_floordiv', operator.floordiv),
+    ast.Mod: ('_mod', operator.mod),
+    ast.Pow: ('_pow', checked_pow),
+}
+
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+# Whitelisted functions callable from expressions
+FUNCTIONS = {
+    'abs': abs, 'round': checked_round, 'min': min, 'max': max,
+    'sqrt': math.sqrt, 'cbrt': math.cbrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10, 'log2': math.log2,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'asin': math.asin, 'acos': math.acos, 'atan': math.atan,
+    'atan2': math.atan2, 'sinh': math.sinh, 'cosh': math.cosh, 'tanh': math.tanh,
+    'degrees': math.degrees, 'radians': math.radians, 'hypot': math.hypot,
+    'floor': math.floor, 'ceil': math.ceil, 'trunc': math.trunc, 'fabs': math.fabs,
+    'gcd': math.gcd, 'lcm': checked_lcm, 'factorial': checked_factorial,
+    'comb': _checked_combinatoric(math.comb, MAX_COMB_N), 'perm': _checked_combinatoric(math.perm, MAX_FACTORIAL_N),
+}
+
+CONSTANTS = {'pi': math.pi, 'e': math.e, 'tau': math.tau, 'inf': math.inf}
+
+# Globals the compiled code runs with: checked operators, functions and constants, no builtins
+SCALAR_NAMESPACE = {
+    '__builtins__': {},
+    **{name: fn for name, fn in BINARY_OPERATORS.values()},
+    '_neg': operator.neg,
+    '_pos': operator.pos,
+    **FUNCTIONS,
+    **CONSTANTS,
+}
+
+RESERVED_NAMES = frozenset(SCALAR_NAMESPACE)
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Validate the tree and route every operator through its checked helper"""
+
+    def __init__(self):
+        self.variables = set()
+        self.depth = 0
+
+    def visit(self, node):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ExpressionError("Expression is nested too deeply")
+        try:
+            return super().visit(node)
+        finally:
+            self.depth -= 1
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"{type(node).__name__} is not allowed in expressions")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ExpressionError(f"Only numbers are allowed, not {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id.startswith('_'):
+            raise ExpressionError(f"Unknown name '{node.id}'")
+        if node.id in FUNCTIONS:
+            raise ExpressionError(f"'{node.id}' is a function, call it like {node.id}(x)")
+        if node.id not in CONSTANTS:
+            self.variables.add(node.id)
+        return node
+
+    def visit_BinOp(self, node):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        return ast.copy_location(ast.Call(
+            func=ast.Name(id=op[0], ctx=ast.Load()),
+            args=[self.visit(node.left), self.visit(node.right)],
+            keywords=[],
+        ), node)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, UNARY_OPERATORS):
+            raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        return ast.copy_location(ast.Call(
+            func=ast.Name(id='_neg' if isinstance(node.op, ast.USub) else '_pos', ctx=ast.Load()),
+            args=[self.visit(node.operand)],
+            keywords=[],
+        ), node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else type(node.func).__name__
+            raise ExpressionError(f"Function '{name}' is not allowed")
+        if node.keywords:
+            raise ExpressionError("Keyword arguments are not allowed")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+# Helpers whose cost grows with their arguments; expressions using them are not "cheap"
+EXPENSIVE_NAMES = frozenset({'_pow', 'factorial', 'comb', 'perm', 'gcd', 'lcm'})
+
+
+def _check_real(value):
+    if isinstance(value, complex):
+        raise ExpressionError("Result is not a real number")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ExpressionError("Result is not a finite number")
+
+
+class CompiledExpression:
+    """A validated expression compiled to a code object, plus the variables it reads"""
+
+    __slots__ = ('source', 'code', 'variables', 'expensive')
+
+    def __init__(self, source, code, variables):
+        self.source = source
+        self.code = code
+        self.variables = variables
+        # Without powers or combinatorics every operation is bounded, so it is safe to run inline
+        self.expensive = not EXPENSIVE_NAMES.isdisjoint(code.co_names)
+
+    def evaluate(self, variables=None, namespace=SCALAR_NAMESPACE):
+        """Run the expression with values for its variables (names from ``self.variables``)"""
+        variables = variables or {}
+        missing = [name for name in self.variables if name not in variables]
+        if missing:
+            raise ExpressionError(f"No value for variable(s): {', '.join(missing)}")
+        try:
+            result = eval(self.code, namespace, {name: variables[name] for name in self.variables})
+        except ExpressionError:
+            raise
+        except ZeroDivisionError:
+            raise ExpressionError("Division by zero") from None
+        except OverflowError:
+            raise ExpressionError("Result is too large") from None
+        except (ValueError, TypeError) as e:
+            raise ExpressionError(str(e)) from None
+        if namespace is SCALAR_NAMESPACE:
+            _check_real(result)
+        return result
+
+
+@lru_cache(maxsize=CALC_CACHE_SIZE)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse, validate and compile ``expression`` (cached by its text)"""
+    if not expression or not expression.strip():
+        raise ExpressionError("Provide an expression to evaluate")
+    if len(expression) > CALC_MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {CALC_MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise ExpressionError(f"Invalid expression: {getattr(e, 'msg', e)}") from None
+    rewriter = _Rewriter()
+    tree = ast.fix_missing_locations(rewriter.visit(tree))
+    return CompiledExpression(expression, compile(tree, '<expression>', 'eval'), tuple(sorted(rewriter.variables)))
+
+
+def validate_variables(variables):
+    """Check caller supplied variable names and values"""
+    for name, value in (variables or {}).items():
+        if not name.isidentifier() or name.startswith('_') or name in RESERVED_NAMES:
+            raise ExpressionError(f"Invalid variable name '{name}'")
+        if type(value) not in (int, float):
+            raise ExpressionError(f"Variable '{name}' must be a number")
+        _check_int(value)
+
+
+def evaluate(expression: str, variables: dict = None):
+    """Evaluate ``expression`` safely, with optional numeric ``variables``"""
+    validate_variables(variables)
+    return compile_expression(expression).evaluate(variables)
+
+
+REDUCTIONS = ('sum', 'mean', 'min', 'max')
+
+
+@functools.cache
+def _numpy_namespace():
+    """Globals that make compiled expressions operate on NumPy arrays"""
+    import numpy as np
+
+    def pow_(base, exponent):
+        if np.any(np.abs(exponent) > CALC_MAX_EXPONENT):
+            raise ExpressionError(f"Exponent exceeds the limit of {CALC_MAX_EXPONENT}")
+        return np.power(np.asarray(base, dtype=np.float64), exponent)
+
+    def elementwise(fn):
+        # Integer-only functions (factorial, comb, ...) run per element through the checked scalar version.
+        # A row it refuses (factorial(5.5), a result over the limit) becomes nan like any other invalid row
+        def call(*args):
+            def scalar(*values):
+                try:
+                    return float(fn(*(int(v) if float(v).is_integer() else v for v in values)))
+                except (ValueError, TypeError, ArithmeticError):
+                    return math.nan
+            return np.vectorize(scalar, otypes=[np.float64])(*args)
+        return call
+
+    def log(x, base=None):
+        return np.log(x) if base is None else np.log(x) / np.log(base)
+
+    def round_(x, digits=0):
+        # Arrays are float64, so digits past the float range only turn results into nan
+        return np.round(x, max(-308, min(int(digits), 308)))
+
+    return {
+        '__builtins__': {},
+        '_add': np.add, '_sub': np.subtract, '_mul': np.multiply, '_div': np.true_divide,
+        '_floordiv': np.floor_divide, '_mod': np.mod, '_pow': pow_, '_neg': np.negative, '_pos': np.positive,
+        'abs': np.abs, 'round': round_,
+        'min': lambda *args: functools.reduce(np.minimum, args), 'max': lambda *args: functools.reduce(np.maximum, args),
+        'sqrt': np.sqrt, 'cbrt': np.cbrt, 'exp': np.exp, 'log': log, 'log10': np.log10, 'log2': np.log2,
+        'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+        'atan2': np.arctan2, 'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh,
+        'degrees': np.degrees, 'radians': np.radians, 'hypot': np.hypot,
+        'floor': np.floor, 'ceil': np.ceil, 'trunc': np.trunc, 'fabs': np.fabs,
+        **{name: elementwise(FUNCTIONS[name]) for name in ('gcd', 'lcm', 'factorial', 'comb', 'perm')},
+        **CONSTANTS,
+    }
+
+
+def evaluate_batch(expression: str, variables: dict, reductions=()) -> dict:
+    """Evaluate ``expression`` once over arrays of values.
+
+    ``variables`` maps names to equally long lists of numbers (or single
+    numbers, which apply to every row). Results that are not finite, such as
+    a division by zero in one row, and rows an integer function refuses come
+    back as None and are left out of the reductions.
+    """
+    import numpy as np
+
+    compiled = compile_expression(expression)
+    unknown = [name for name in reductions or () if name not in REDUCTIONS]
+    if unknown:
+        raise ExpressionError(f"Unknown reduction(s) {', '.join(unknown)}, use {', '.join(REDUCTIONS)}")
+
+    arrays = {}
+    rows = None
+    for name, values in (variables or {}).items():
+        if not name.isidentifier() or name.startswith('_') or name in RESERVED_NAMES:
+            raise ExpressionError(f"Invalid variable name '{name}'")
+        try:
+            array = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ExpressionError(f"Variable '{name}' must be a number or a list of numbers") from None
+        if array.ndim > 1:
+            raise ExpressionError(f"Variable '{name}' must be a flat list")
+        if array.ndim == 1:
+            if rows is not None and len(array) != rows:
+                raise ExpressionError(f"Variable '{name}' has {len(array)} values, expected {rows}")
+            rows = len(array)
+        arrays[name] = array
+    rows = 1 if rows is None else rows
+    if rows > CALC_BATCH_MAX_ROWS:
+        raise ExpressionError(f"At most {CALC_BATCH_MAX_ROWS} values per variable")
+
+    with np.errstate(all='ignore'):
+        result = np.broadcast_to(np.asarray(compiled.evaluate(arrays, _numpy_namespace()), dtype=np.float64), (rows,))
+    finite = np.isfinite(result)
+    output = {
+        'count': rows,
+        'results': [value if ok else None for value, ok in zip(result.tolist(), finite.tolist())],
+        'invalid': int(rows - finite.sum()),
+    }
+    if reductions:
+        valid = result[finite]
+        output['reductions'] = {
+            name: (float(getattr(np, name)(valid)) if len(valid) else None) for name in reductions
+        }
+    return output
+
+
+def cache_stats() -> dict:
+    info = compile_expression.cache_info()
+    lookups = info.hits + info.misses
+    return {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize, 'max_entries': info.maxsize,
+            'hit_rate': round(info.hits / lookups, 3) if lookups else None}
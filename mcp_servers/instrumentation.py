@@ -0,0 +1,143 @@
+"""Per-call instrumentation shared by the MCP servers.
+
+``instrument(mcp)`` makes ``mcp.tool(...)`` register a wrapped function that
+runs each tool call inside a tracing root span, writes an access log line
+for it and, when that tool is the one selected for profiling, runs it under
+cProfile. The undecorated function is returned to the module, so tools that
+call each other directly (e.g. ``quick_add_expense`` -> ``add_expense``) are
+not counted twice. Calls still running are counted, so a shutdown can wait
+for them (``in_flight()``). With a ``rate_limit.Limiter`` each call is first
+charged to its caller, and heavy tools wait for a slot.
+"""
+import asyncio
+import contextlib
+import functools
+import inspect
+import threading
+
+from mcp_servers import access_log, profiling, rate_limit, tracing
+
+
+def instrument(mcp, current_user=None, limiter=None):
+    """Instrument every tool registered on ``mcp`` from now on.
+
+    ``current_user`` is an optional callable returning the id of the
+    logged-in user, recorded in the access log and used as the rate-limit key.
+    ``limiter`` is an optional ``rate_limit.Limiter``.
+    """
+    register_tool = mcp.tool
+
+    def tool(*args, **kwargs):
+        decorator = register_tool(*args, **kwargs)
+        tool_name = kwargs.get('name') or (args[0] if args else None)
+
+        def register(fn):
+            decorator(_wrap_tool(mcp, tool_name or fn.__name__, fn, current_user, limiter))
+            return fn
+        return register
+
+    mcp.tool = tool
+    return mcp
+
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def in_flight():
+    """Number of tool calls currently running in this process"""
+    return _in_flight
+
+
+@contextlib.contextmanager
+def _track_call():
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def session_id(mcp):
+    """Identify the MCP session of the request being handled, if any"""
+    try:
+        ctx = mcp.get_context()
+        request = ctx.request_context.request
+        if request is not None:
+            sid = request.query_params.get('session_id') or request.headers.get('mcp-session-id')
+            if sid:
+                return sid
+        return f"{id(ctx.session):x}"
+    except Exception:
+        return None
+
+
+def caller(mcp, current_user, by_address=False):
+    """Rate-limit key of the call being handled: the user, else the client address.
+
+    Sessions are not used: in stateless HTTP mode every request is a new one.
+    """
+    if not by_address:
+        user_id = current_user() if current_user is not None else None
+        if user_id:
+            return f"user:{user_id}"
+    try:
+        request = mcp.get_context().request_context.request
+    except (LookupError, ValueError):
+        request = None
+    address = rate_limit.client_address(request) if request is not None else None
+    # Without a request (stdio) there is a single local client
+    return f"addr:{address}" if address else 'local'
+
+
+def _wrap_tool(mcp, tool_name, fn, current_user, limiter):
+    server_name = mcp.name
+    attributes = {'mcp.server': server_name, 'mcp.tool': tool_name}
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with _track_call(), access_log.record_call(server_name, tool_name, kwargs, session_id(mcp), current_user) as call, \
+                    tracing.span(f"tool {tool_name}", **attributes):
+                async with _admit(mcp, tool_name, current_user, limiter):
+                    result = await profiling.tool_profiler.profile_async(tool_name, fn(*args, **kwargs))
+                access_log.set_result(call, result)
+                return result
+        return async_wrapper
+
+    if limiter is not None and limiter.offloads(tool_name):
+        def run(*args, **kwargs):
+            with profiling.tool_profiler.profile(tool_name):
+                return fn(*args, **kwargs)
+
+        # Heavy tools run in a worker thread, so calls waiting for a slot don't block the event loop
+        @functools.wraps(fn)
+        async def offloaded_wrapper(*args, **kwargs):
+            with _track_call(), access_log.record_call(server_name, tool_name, kwargs, session_id(mcp), current_user) as call, \
+                    tracing.span(f"tool {tool_name}", **attributes):
+                async with limiter.admit(tool_name, caller(mcp, current_user, tool_name in limiter.by_address)):
+                    result = await asyncio.to_thread(run, *args, **kwargs)
+                access_log.set_result(call, result)
+                return result
+        return offloaded_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _track_call(), access_log.record_call(server_name, tool_name, kwargs, session_id(mcp), current_user) as call, \
+                tracing.span(f"tool {tool_name}", **attributes):
+            if limiter is not None:
+                limiter.charge(tool_name, caller(mcp, current_user, tool_name in limiter.by_address))
+            with profiling.tool_profiler.profile(tool_name):
+                result = fn(*args, **kwargs)
+            access_log.set_result(call, result)
+            return result
+    return wrapper
+
+
+def _admit(mcp, tool_name, current_user, limiter):
+    if limiter is None:
+        return contextlib.nullcontext()
+    return limiter.admit(tool_name, caller(mcp, current_user, tool_name in limiter.by_address))
@@ -0,0 +1,31 @@
+"""JSON encoding for tool results.
+
+Uses orjson when it is installed (several times faster than the standard
+library on long expense lists) and falls back to ``json`` otherwise, or for
+values orjson cannot encode such as integers wider than 64 bits. Output is
+compact; JSON_PRETTY=1 indents it for reading while debugging.
+
+    JSON_PRETTY=0
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # standard library only
+    orjson = None
+
+JSON_PRETTY = os.getenv('JSON_PRETTY', '0').lower() in ('1', 'true', 'yes')
+
+
+def dumps(data, pretty=None) -> str:
+    """Encode data as compact JSON, or indented when pretty (default JSON_PRETTY)"""
+    pretty = JSON_PRETTY if pretty is None else pretty
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)).decode('utf-8')
+        except TypeError:
+            pass
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
@@ -0,0 +1,26 @@
+"""Registry of metric sources served as one JSON document at /metrics.
+
+Components register a zero-argument callable returning a JSON-serializable
+snapshot; ``snapshot()`` collects them all.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_sources = {}
+
+
+def register(name, source):
+    """Expose ``source()`` under ``name`` in the metrics snapshot"""
+    _sources[name] = source
+
+
+def snapshot() -> dict:
+    result = {}
+    for name, source in list(_sources.items()):
+        try:
+            result[name] = source()
+        except Exception as e:
+            logger.warning(f"Metrics source {name} failed: {e}")
+            result[name] = {'error': str(e)}
+    return result
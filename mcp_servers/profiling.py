@@ -0,0 +1,203 @@
+"""On-demand profiling for a live server process.
+
+Both profilers are disabled unless PROFILING_ENABLED=1 and are driven from
+the admin routes in fastapi_server/admin.py, so a running server can be
+profiled without a restart:
+
+- ``sampler`` samples every thread's stack for N seconds and writes a
+  collapsed-stack file (one ``frame;frame;frame count`` line per stack) that
+  flamegraph.pl, speedscope or inferno can render.
+- ``tool_profiler`` runs cProfile around every call of one chosen tool and
+  keeps the slowest K calls. PROFILE_TOOL / PROFILE_TOP_K set the initial
+  choice.
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+MAX_SAMPLE_SECONDS = 300
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Periodically capture the stack of every thread from a background thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.current = None
+        self.last = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval_ms: float = SAMPLE_INTERVAL_MS) -> dict:
+        """Start sampling for ``seconds``; returns where the output will be written"""
+        if not 0 < seconds <= MAX_SAMPLE_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_SAMPLE_SECONDS}")
+        if not interval_ms > 0:
+            raise ValueError("interval_ms must be greater than 0")
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A sampling session is already running")
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"samples-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed")
+            self.current = {'file': path, 'seconds': seconds, 'interval_ms': interval_ms,
+                            'started_at': datetime.now().isoformat(timespec='seconds')}
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval_ms / 1000, path),
+                                            name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return dict(self.current)
+
+    def _run(self, seconds, interval, path):
+        own_id = threading.get_ident()
+        names = {}
+        counts = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                counts[';'.join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last = dict(self.current, samples=samples, stacks=len(counts))
+        self.current = None
+
+    def status(self) -> dict:
+        return {'running': self.running, 'current': self.current, 'last': self.last}
+
+
+class _ProfiledSteps:
+    """Drive a coroutine with the profiler enabled only while one of its steps runs.
+
+    cProfile hooks the whole thread, so enabling it around an ``await`` would
+    also record every other task the event loop runs in the meantime.
+    """
+
+    def __init__(self, coro, profiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                awaited = self.coro.send(value) if error is None else self.coro.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield awaited), None
+            except GeneratorExit:
+                self.coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+
+class ToolProfiler:
+    """cProfile every call of one tool and keep the slowest ``top_k`` profiles"""
+
+    def __init__(self, tool=None, top_k=5):
+        self._lock = threading.Lock()
+        # cProfile cannot profile two calls at once; overlapping calls are skipped
+        self._busy = threading.Lock()
+        self._seq = itertools.count()
+        self.tool = tool
+        self.top_k = top_k
+        self._slowest = []
+
+    def configure(self, tool, top_k=5):
+        """Choose the tool to profile (None to stop) and discard earlier captures"""
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        with self._lock:
+            self.tool = tool
+            self.top_k = top_k
+            self._slowest = []
+
+    @contextmanager
+    def profile(self, tool_name):
+        if not PROFILING_ENABLED or tool_name != self.tool or not self._busy.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            self._busy.release()
+            self._record(tool_name, duration, profiler)
+
+    async def profile_async(self, tool_name, coro):
+        """Await ``coro``, profiling only its own steps and not the tasks that run while it waits"""
+        if not PROFILING_ENABLED or tool_name != self.tool or not self._busy.acquire(blocking=False):
+            return await coro
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return await _ProfiledSteps(coro, profiler)
+        finally:
+            duration = time.perf_counter() - start
+            self._busy.release()
+            self._record(tool_name, duration, profiler)
+
+    def _record(self, tool_name, duration, profiler):
+        with self._lock:
+            if tool_name != self.tool:
+                return
+            entry = (duration, next(self._seq), datetime.now().isoformat(timespec='seconds'), profiler)
+            if len(self._slowest) < self.top_k:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def report(self, limit=25) -> dict:
+        """Slowest captured calls, each with its top functions by cumulative time"""
+        with self._lock:
+            captured = sorted(self._slowest, reverse=True)
+        calls = []
+        for duration, _, captured_at, profiler in captured:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+            calls.append({'duration_ms': round(duration * 1000, 3), 'captured_at': captured_at, 'stats': out.getvalue()})
+        return {'enabled': PROFILING_ENABLED, 'tool': self.tool, 'top_k': self.top_k, 'calls': calls}
+
+
+sampler = SamplingProfiler()
+tool_profiler = ToolProfiler(os.getenv('PROFILE_TOOL') or None, int(os.getenv('PROFILE_TOP_K', '5')))
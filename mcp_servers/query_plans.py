@@ -0,0 +1,104 @@
+"""Helpers for running and inspecting MongoDB explain() output."""
+
+# Keys a command picks up on its way through the driver that explain rejects
+DRIVER_FIELDS = ('lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'signature', 'apiVersion')
+
+# Commands that accept an explain wrapper
+EXPLAINABLE_COMMANDS = ('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify')
+
+# Keys under which a plan stage nests its children
+PLAN_CHILD_KEYS = ('inputStage', 'thenStage', 'elseStage', 'outerStage', 'innerStage')
+
+
+def explain_command(db, command: dict, verbosity: str = 'executionStats') -> dict:
+    """Run explain on a command captured from the driver (e.g. by a CommandListener)"""
+    cleaned = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+    return db.command({'explain': cleaned, 'verbosity': verbosity})
+
+
+def _planner_section(explain: dict) -> dict:
+    """Return the part of an explain document holding queryPlanner/executionStats.
+
+    Aggregations that could not be pushed down entirely report the query
+    under the first ``$cursor`` stage instead of at the top level.
+    """
+    if 'queryPlanner' in explain:
+        return explain
+    for stage in explain.get('stages', []):
+        if '$cursor' in stage:
+            return stage['$cursor']
+    return {}
+
+
+def winning_plan(explain: dict) -> dict:
+    """Return the winning plan tree in classic stage names"""
+    plan = _planner_section(explain).get('queryPlanner', {}).get('winningPlan', {})
+    # Slot-based engine plans wrap the classic tree under 'queryPlan'
+    return plan.get('queryPlan', plan)
+
+
+def execution_stats(explain: dict) -> dict:
+    """Return the executionStats section of an explain document"""
+    return _planner_section(explain).get('executionStats', {})
+
+
+def iter_stages(plan: dict):
+    """Yield every stage of a plan tree, root first"""
+    if not plan:
+        return
+    yield plan
+    for key in PLAN_CHILD_KEYS:
+        if key in plan:
+            yield from iter_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from iter_stages(child)
+
+
+def plan_summary(explain: dict) -> str:
+    """Short one-line description of a plan such as 'FETCH > IXSCAN(user_date)'"""
+    parts = []
+    for stage in iter_stages(winning_plan(explain)):
+        name = stage.get('stage', '?')
+        if stage.get('indexName'):
+            name += f"({stage['indexName']})"
+        parts.append(name)
+    return ' > '.join(parts) or 'unknown'
+
+
+def docs_examined(explain: dict):
+    """Number of documents the server examined, or None if not reported"""
+    return execution_stats(explain).get('totalDocsExamined')
+
+
+def _is_grouped(explain: dict) -> bool:
+    if any(stage.get('stage') == 'GROUP' for stage in iter_stages(winning_plan(explain))):
+        return True
+    return any('$group' in stage for stage in explain.get('stages', []))
+
+
+def plan_problems(explain: dict, max_ratio=None) -> list:
+    """List the reasons a plan should not be trusted on a large collection.
+
+    Flags collection scans, blocking sorts over raw documents (a SORT stage
+    that sits above a GROUP only orders the grouped output and is fine) and,
+    when ``max_ratio`` is given, plans that examine more than ``max_ratio``
+    documents per document returned. Grouped plans skip the ratio check since
+    their output is smaller than their input by design.
+    """
+    problems = []
+    for stage in iter_stages(winning_plan(explain)):
+        name = stage.get('stage')
+        if name == 'COLLSCAN':
+            problems.append('collection scan (COLLSCAN)')
+        elif name == 'SORT':
+            if not any(child.get('stage') == 'GROUP' for child in iter_stages(stage)):
+                problems.append('in-memory SORT stage')
+
+    if max_ratio is not None and not _is_grouped(explain):
+        stats = execution_stats(explain)
+        examined = stats.get('totalDocsExamined', 0)
+        returned = stats.get('nReturned', 0)
+        ratio = examined / max(returned, 1)
+        if ratio > max_ratio:
+            problems.append(f"examined {examined} docs for {returned} returned (ratio {ratio:.1f} > {max_ratio})")
+    return problems
@@ -0,0 +1,236 @@
+"""Per-caller rate limits and a concurrency cap for expensive tools.
+
+Every call is charged its tool's cost against two token buckets: one per
+caller and one per caller and tool. The first bounds a caller's total load.
+The second stops one tool being called in a loop while the caller's other
+tools keep working. Callers are the logged-in user, or the client address
+before login (``client_address``). Tools keyed by address, such as login,
+always use the address, with their own, stricter per-tool bucket. Heavy
+tools, the ones that scan a user's whole history, also need one of
+HEAVY_QUERY_CONCURRENCY slots per process. Excess calls wait up to
+HEAVY_QUERY_QUEUE_TIMEOUT for a slot. After that they are rejected, and
+their tokens are given back. A rejected call raises ``RateLimited``. Its
+message tells the client how long to wait.
+
+    RATE_LIMIT_ENABLED=1 RATE_LIMIT_BURST=60 RATE_LIMIT_PER_SECOND=2
+    RATE_LIMIT_TOOL_BURST=20 RATE_LIMIT_TOOL_PER_SECOND=0.5
+    RATE_LIMIT_TRUSTED_PROXIES=10.0.0.0/8
+    HEAVY_QUERY_CONCURRENCY=4 HEAVY_QUERY_QUEUE_TIMEOUT=2
+"""
+import asyncio
+import contextlib
+import ipaddress
+import os
+import threading
+import time
+from collections import Counter
+
+# Token buckets, in cost units (a cheap tool costs 1)
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '60'))
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', '2'))
+RATE_LIMIT_TOOL_BURST = float(os.getenv('RATE_LIMIT_TOOL_BURST', '20'))
+RATE_LIMIT_TOOL_PER_SECOND = float(os.getenv('RATE_LIMIT_TOOL_PER_SECOND', '0.5'))
+# Buckets kept before refilled (idle) ones are dropped
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', '10000'))
+# Proxies (addresses or CIDR ranges) whose X-Forwarded-For header is believed, e.g. the
+# platform's load balancer. Without them the peer address of the connection is used
+RATE_LIMIT_TRUSTED_PROXIES = [ipaddress.ip_network(proxy.strip(), strict=False)
+                              for proxy in os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+
+# Heavy tools running at once in this process (0 = no cap, heavy tools run like the others)
+HEAVY_QUERY_CONCURRENCY = int(os.getenv('HEAVY_QUERY_CONCURRENCY', '4'))
+# Seconds a heavy call waits for a slot before it is rejected
+HEAVY_QUERY_QUEUE_TIMEOUT = float(os.getenv('HEAVY_QUERY_QUEUE_TIMEOUT', '2'))
+
+
+class RateLimited(Exception):
+    """A call was refused; ``retry_after`` is the number of seconds to wait"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(f"{message}; retry after {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+def _trusted_proxy(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_address(request):
+    """Address of the client that sent a Starlette request, looking through trusted proxies"""
+    host = request.client.host if request.client else None
+    if host is None or not _trusted_proxy(host):
+        return host
+    # Rightmost hop not added by one of our proxies; anything left of it could be forged
+    hops = [hop.strip() for value in request.headers.getlist('x-forwarded-for') for hop in value.split(',')]
+    for hop in reversed([hop for hop in hops if hop]):
+        host = hop
+        if not _trusted_proxy(hop):
+            break
+    return host
+
+
+class TokenBucket:
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, cost):
+        """Seconds until ``cost`` tokens are available (0 if they are now)"""
+        if self.tokens >= cost:
+            return 0.0
+        if cost > self.capacity or self.rate <= 0:
+            return float('inf')
+        return (cost - self.tokens) / self.rate
+
+
+class Limiter:
+    """Token buckets per caller and per caller and tool, and the heavy-tool slots.
+
+    ``costs`` maps tool names to their cost (default 1). ``heavy`` names the
+    tools that share the concurrency cap. Synchronous heavy tools run in a worker
+    thread, so waiting for them does not block the event loop. ``tool_limits``
+    maps tools to their own (burst, per_second) for the per-tool bucket, and
+    ``by_address`` names tools charged to the client address even after login.
+    """
+
+    def __init__(self, costs=None, heavy=(), tool_limits=None, by_address=(), enabled=RATE_LIMIT_ENABLED,
+                 burst=RATE_LIMIT_BURST, per_second=RATE_LIMIT_PER_SECOND,
+                 tool_burst=RATE_LIMIT_TOOL_BURST, tool_per_second=RATE_LIMIT_TOOL_PER_SECOND,
+                 concurrency=HEAVY_QUERY_CONCURRENCY, queue_timeout=HEAVY_QUERY_QUEUE_TIMEOUT):
+        self.costs = dict(costs or {})
+        self.heavy = frozenset(heavy)
+        self.tool_limits = dict(tool_limits or {})
+        self.by_address = frozenset(by_address)
+        self.enabled = enabled
+        self.burst = burst
+        self.per_second = per_second
+        self.tool_burst = tool_burst
+        self.tool_per_second = tool_per_second
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._buckets = {}
+        # The semaphore belongs to the event loop that created it
+        self._slots = None
+        self._slots_loop = None
+        self._running = 0
+        self._waiting = 0
+        self.allowed = Counter()
+        self.limited = Counter()
+
+    def cost(self, tool):
+        return self.costs.get(tool, 1)
+
+    def _tool_limit(self, tool):
+        return self.tool_limits.get(tool, (self.tool_burst, self.tool_per_second))
+
+    def offloads(self, tool):
+        """Whether ``tool`` takes a heavy slot (and, if synchronous, runs in a thread)"""
+        return tool in self.heavy and self.concurrency > 0
+
+    def _bucket(self, key, capacity, rate, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= RATE_LIMIT_MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(capacity, rate, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _prune(self, now):
+        for key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+
+    def charge(self, tool, caller):
+        """Take the tool's cost from the caller's buckets, or raise RateLimited"""
+        if not self.enabled:
+            return
+        cost = self.cost(tool)
+        with self._lock:
+            now = time.monotonic()
+            user = self._bucket(caller, self.burst, self.per_second, now)
+            per_tool = self._bucket((caller, tool), *self._tool_limit(tool), now)
+            wait = max(user.wait(cost), per_tool.wait(cost))
+            if wait > 0:
+                self.limited[tool] += 1
+                scope = 'calls' if user.wait(cost) >= per_tool.wait(cost) else f"{tool} calls"
+                raise RateLimited(f"Too many {scope}", wait)
+            user.tokens -= cost
+            per_tool.tokens -= cost
+            self.allowed[tool] += 1
+
+    def refund(self, tool, caller):
+        """Give back the tokens of a call that was charged but never ran"""
+        if not self.enabled:
+            return
+        cost = self.cost(tool)
+        with self._lock:
+            self.allowed[tool] -= 1
+            for key, capacity in ((caller, self.burst), ((caller, tool), self._tool_limit(tool)[0])):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.tokens = min(capacity, bucket.tokens + cost)
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    @contextlib.asynccontextmanager
+    async def admit(self, tool, caller):
+        """Charge the call and, for a heavy tool, hold a slot while it runs"""
+        self.charge(tool, caller)
+        if not self.offloads(tool):
+            yield
+            return
+        slots = self._semaphore()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.refund(tool, caller)
+            with self._lock:
+                self.limited[tool] += 1
+            raise RateLimited(f"Server is busy with other {tool} calls", self.queue_timeout) from None
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'burst': self.burst,
+                'per_second': self.per_second,
+                'tool_burst': self.tool_burst,
+                'tool_per_second': self.tool_per_second,
+                'tool_limits': {tool: {'burst': burst, 'per_second': rate} for tool, (burst, rate) in self.tool_limits.items()},
+                'buckets': len(self._buckets),
+                'allowed': dict(self.allowed),
+                'limited': dict(self.limited),
+                'heavy': {'concurrency': self.concurrency, 'queue_timeout': self.queue_timeout,
+                          'running': self._running, 'waiting': self._waiting},
+            }
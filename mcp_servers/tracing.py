@@ -0,0 +1,230 @@
+"""Lightweight request tracing for the MCP servers.
+
+Every tool call opens a root span (see ``instrumentation.instrument``); code
+inside the call opens child spans with ``span(...)`` and every MongoDB
+command becomes a child span automatically. Spans are only recorded when an
+exporter is configured:
+
+    TRACE_EXPORTER=file   JSON lines appended to TRACE_FILE (default traces.jsonl)
+    TRACE_EXPORTER=otlp   OTLP/HTTP JSON posted to OTEL_EXPORTER_OTLP_ENDPOINT
+                          (default http://localhost:4318), e.g. a local collector
+
+Export happens on a background thread so the tool call never waits on I/O.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+
+import requests
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+OTLP_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318').rstrip('/')
+SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'expense-tracker-mcp')
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL_SECONDS = 1.0
+
+enabled = TRACE_EXPORTER in ('file', 'otlp')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed unit of work; child spans share the trace id of their parent"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = str(error)
+        _exporter.submit(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def current_span():
+    """Return the innermost open span, or None"""
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Open a child of the current span for the duration of the block"""
+    if not enabled:
+        yield None
+        return
+    s = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(s)
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end(error)
+
+
+class _MongoCommandTracer(monitoring.CommandListener):
+    """Turn each MongoDB command issued inside a span into a child span"""
+
+    def __init__(self):
+        self._open = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._open[(event.request_id, event.connection_id)] = Span(f"mongo {event.command_name}", parent, {
+            'db.system': 'mongodb',
+            'db.name': event.database_name,
+            'db.operation': event.command_name,
+            'db.collection': collection if isinstance(collection, str) else None,
+        })
+
+    def succeeded(self, event):
+        s = self._open.pop((event.request_id, event.connection_id), None)
+        if s:
+            s.end()
+
+    def failed(self, event):
+        s = self._open.pop((event.request_id, event.connection_id), None)
+        if s:
+            s.end(event.failure)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(s):
+    otlp = {
+        'traceId': s.trace_id,
+        'spanId': s.span_id,
+        'name': s.name,
+        'kind': 1,
+        'startTimeUnixNano': str(s.start_ns),
+        'endTimeUnixNano': str(s.end_ns),
+        'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items() if v is not None],
+        'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+    }
+    if s.parent_id:
+        otlp['parentSpanId'] = s.parent_id
+    return otlp
+
+
+class _Exporter:
+    """Batch finished spans and write them out on a daemon thread"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, s):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                    self._thread.start()
+        self._queue.put(s)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.warning(f"Dropping {len(batch)} spans, export failed: {e}")
+
+    def _write(self, batch):
+        if self.kind == 'file':
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                for s in batch:
+                    f.write(json.dumps(s.to_dict()) + '\n')
+        elif self.kind == 'otlp':
+            payload = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': [_otlp_span(s) for s in batch]}],
+            }]}
+            requests.post(f"{OTLP_ENDPOINT}/v1/traces", json=payload, timeout=5).raise_for_status()
+
+    def shutdown(self, timeout=5.0):
+        """Flush queued spans and stop the export thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_exporter = _Exporter(TRACE_EXPORTER)
+
+
+def shutdown(timeout=5.0):
+    """Flush all pending spans (called at exit and on server shutdown)"""
+    _exporter.shutdown(timeout)
+
+
+if enabled:
+    monitoring.register(_MongoCommandTracer())
+    atexit.register(shutdown)
@@ -1,11 +1,24 @@
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 import os
-import requests
+import asyncio
+import contextvars
+import hashlib
+import httpx
 import logging
-from datetime import datetime
-from typing import Optional
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Literal, Optional
 from dotenv import load_dotenv
+from mcp_servers import access_log, json_codec, metrics
+from mcp_servers.instrumentation import instrument
+from mcp_servers.tracing import span
+from mcp_servers.weather_model import WeatherObservation
+from mcp_servers.weather_store import LocationStore, ObservationStore, QuotaStore
 
 # Load environment variables
 load_dotenv()
@@ -14,35 +27,475 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Current conditions only change every 10-60 minutes and the free AccuWeather
+# tier allows ~50 calls a day, so responses are cached per location key
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '900'))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '128'))
+
+# Upstream HTTP settings; retries back off exponentially from WEATHER_HTTP_BACKOFF seconds
+WEATHER_HTTP_TIMEOUT = float(os.getenv('WEATHER_HTTP_TIMEOUT', '10'))
+WEATHER_HTTP_RETRIES = int(os.getenv('WEATHER_HTTP_RETRIES', '2'))
+WEATHER_HTTP_BACKOFF = float(os.getenv('WEATHER_HTTP_BACKOFF', '0.5'))
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv('WEATHER_HTTP_MAX_CONNECTIONS', '10'))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upstream fetches in flight at once (per process, shared by every tool and the
+# background refresher), and locations per batch call
+WEATHER_MAX_CONCURRENCY = int(os.getenv('WEATHER_MAX_CONCURRENCY', '4'))
+WEATHER_BATCH_MAX_LOCATIONS = int(os.getenv('WEATHER_BATCH_MAX_LOCATIONS', '20'))
+
+# AccuWeather API root; point it at scripts/fake_accuweather.py to run without a key
+DEFAULT_ACCUWEATHER_BASE_URL = "http://dataservice.accuweather.com"
+ACCUWEATHER_BASE_URL = os.getenv('ACCUWEATHER_BASE_URL', DEFAULT_ACCUWEATHER_BASE_URL).rstrip('/')
+
+# Expired observations are kept up to WEATHER_STALE_TTL seconds and served when
+# AccuWeather fails. Locations requested within WEATHER_HOT_WINDOW seconds are
+# refreshed in the background once WEATHER_REFRESH_AHEAD of their TTL has passed
+WEATHER_STALE_TTL = int(os.getenv('WEATHER_STALE_TTL', '86400'))
+WEATHER_REFRESH_INTERVAL = int(os.getenv('WEATHER_REFRESH_INTERVAL', '60'))
+WEATHER_REFRESH_AHEAD = float(os.getenv('WEATHER_REFRESH_AHEAD', '0.8'))
+WEATHER_HOT_WINDOW = int(os.getenv('WEATHER_HOT_WINDOW', '3600'))
+
+# After WEATHER_BREAKER_FAILURES consecutive upstream failures, stop calling
+# AccuWeather for WEATHER_BREAKER_RESET seconds before trying again
+WEATHER_BREAKER_FAILURES = int(os.getenv('WEATHER_BREAKER_FAILURES', '3'))
+WEATHER_BREAKER_RESET = int(os.getenv('WEATHER_BREAKER_RESET', '60'))
+
+# AccuWeather calls allowed per API key and UTC day. Once WEATHER_QUOTA_CACHE_ONLY_SHARE
+# of it is used, anything cached is served (however old) instead of calling upstream
+WEATHER_DAILY_QUOTA = int(os.getenv('WEATHER_DAILY_QUOTA', '50'))
+WEATHER_QUOTA_CACHE_ONLY_SHARE = float(os.getenv('WEATHER_QUOTA_CACHE_ONLY_SHARE', '0.8'))
+
 # Create FastMCP instance
-mcp = FastMCP("weather-service")
+mcp = instrument(FastMCP("weather-service"))
+
+# Every fetched observation, so history is answered without upstream calls. Shared with
+# WeatherService, but usable without it (and without an API key); opened on first use
+observation_store = ObservationStore()
+
+class CircuitBreaker:
+    """Fail fast while an upstream is down instead of waiting for its timeout on every call"""
+    
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Whether a request may go upstream now (one trial request when half-open)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+    
+    def end_trial(self):
+        """Call when the half-open trial request ends, however it ended. A trial that
+        recorded neither success nor failure counts as a failure; otherwise the
+        breaker would stay half-open and refuse every later request"""
+        with self._lock:
+            unsettled = self.state == 'half_open'
+        if unsettled:
+            self.record_failure()
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    logger.warning(f"AccuWeather circuit opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+    
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures, 'times_opened': self.times_opened}
+
+class QuotaTracker:
+    """Count upstream calls against the API key's daily quota, persisted in SQLite"""
+    
+    def __init__(self, api_key, daily_quota, cache_only_share, store):
+        # Only a hash of the key is stored on disk
+        self.key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        self.daily_quota = daily_quota
+        self.cache_only_share = cache_only_share
+        self.store = store
+        self.day = None
+        self.used = 0
+        self.cache_only_served = 0
+        self._lock = threading.Lock()
+    
+    def _refresh(self):
+        # Other workers share the count, so it is read from the store every time
+        self.day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        self.used = self.store.usage(self.key_hash, self.day)
+    
+    def reserve(self):
+        """Count one upstream call against today's quota, or return False if it is used up"""
+        with self._lock:
+            self.day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+            used = self.store.reserve(self.key_hash, self.day, self.daily_quota)
+            if used is None:
+                self.used = self.store.usage(self.key_hash, self.day)
+                return False
+            self.used = used
+            if used == self.daily_quota:
+                logger.warning(f"AccuWeather daily quota of {self.daily_quota} calls used up")
+            return True
+    
+    def cache_only(self):
+        """True once the cache-only share of today's quota is used"""
+        with self._lock:
+            self._refresh()
+            return self.used >= self.daily_quota * self.cache_only_share
+    
+    def record_cache_only(self):
+        with self._lock:
+            self.cache_only_served += 1
+    
+    def exhausted(self):
+        with self._lock:
+            self._refresh()
+            return self.used >= self.daily_quota
+    
+    def snapshot(self):
+        with self._lock:
+            self._refresh()
+            now = datetime.now(timezone.utc)
+            hours = (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() / 3600
+            burn_rate = self.used / hours if hours else 0.0
+            return {
+                'day': self.day,
+                'used': self.used,
+                'daily_quota': self.daily_quota,
+                'remaining': max(self.daily_quota - self.used, 0),
+                'share_used': round(self.used / self.daily_quota, 3) if self.daily_quota else None,
+                'cache_only': self.used >= self.daily_quota * self.cache_only_share,
+                'cache_only_served': self.cache_only_served,
+                'burn_rate_per_hour': round(burn_rate, 2),
+                'projected_daily_use': round(burn_rate * 24)
+            }
+
+class UpstreamUnavailable(Exception):
+    """AccuWeather failed (network error, 429 or 5xx), the circuit is open or the quota is used up"""
 
 class WeatherService:
-    def __init__(self):
-        self.accuweather_api_key = os.getenv('ACCUWEATHER_API_KEY')
+    def __init__(self, base_url=None, api_key=None):
+        self.accuweather_api_key = api_key or os.getenv('ACCUWEATHER_API_KEY')
         
-        # Kandugula location key from AccuWeather
+        # Kandugula location key from AccuWeather, used when a call names no location
         self.location_key = "2828381"
-        self.base_url = "http://dataservice.accuweather.com"
+        self.base_url = (base_url or ACCUWEATHER_BASE_URL).rstrip('/')
         
+        # Only the real API needs a key; local stand-ins accept any
         if not self.accuweather_api_key:
-            raise ValueError("Please set ACCUWEATHER_API_KEY environment variable")
+            if self.base_url == DEFAULT_ACCUWEATHER_BASE_URL:
+                raise ValueError("Please set ACCUWEATHER_API_KEY environment variable")
+            self.accuweather_api_key = 'local'
+        
+        # LRU-ordered cache: location_key -> WeatherObservation
+        self.cache_ttl = WEATHER_CACHE_TTL
+        self.cache_max_entries = WEATHER_CACHE_MAX_ENTRIES
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'upstream_calls': 0, 'evictions': 0, 'location_store_hits': 0,
+                      'stale_served': 0, 'background_refreshes': 0, 'short_circuited': 0, 'coalesced': 0}
+        self.stale_ttl = WEATHER_STALE_TTL
+        self._last_access = {}
+        self._refreshers = weakref.WeakKeyDictionary()
+        # In-flight upstream fetches per event loop and location key, shared by concurrent callers
+        self._inflight = weakref.WeakKeyDictionary()
+        self.breaker = CircuitBreaker(WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET)
+        
+        # Location metadata persisted on disk, looked up live only on a first-ever miss
+        self.location_store = LocationStore()
+        self.observation_store = observation_store
+        self.quota = QuotaTracker(self.accuweather_api_key, WEATHER_DAILY_QUOTA, WEATHER_QUOTA_CACHE_ONLY_SHARE, QuotaStore())
+        
+        # Keep-alive connection pools, one per event loop since an AsyncClient
+        # cannot be shared between loops (e.g. callers on other threads)
+        self._clients = weakref.WeakKeyDictionary()
+        # WEATHER_MAX_CONCURRENCY slots for upstream fetches, one semaphore per event loop for the same reason
+        self._fetch_slots = weakref.WeakKeyDictionary()
+    
+    def _count(self, counter):
+        with self._cache_lock:
+            self.stats[counter] += 1
+    
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=WEATHER_HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=WEATHER_HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=WEATHER_HTTP_MAX_CONNECTIONS)
+            )
+            self._clients[loop] = client
+        return client
+    
+    def _fetch_slot(self):
+        loop = asyncio.get_running_loop()
+        slots = self._fetch_slots.get(loop)
+        if slots is None:
+            slots = self._fetch_slots[loop] = asyncio.Semaphore(WEATHER_MAX_CONCURRENCY)
+        return slots
+    
+    async def aclose(self):
+        """Stop background refreshes and close pooled upstream connections of the running event loop"""
+        loop = asyncio.get_running_loop()
+        task = self._refreshers.pop(loop, None)
+        if task is not None:
+            task.cancel()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+    
+    async def _get(self, url, params, span_name, location_key):
+        """GET from AccuWeather, retrying connection errors and 429/5xx responses with backoff.
+        Every attempt is reserved against the daily quota first; raises UpstreamUnavailable once it is used up"""
+        client = self._get_client()
+        for attempt in range(WEATHER_HTTP_RETRIES + 1):
+            if not self.quota.reserve():
+                raise UpstreamUnavailable("daily AccuWeather quota used up")
+            self._count('upstream_calls')
+            try:
+                with span(span_name, location_key=location_key, attempt=attempt):
+                    response = await client.get(url, params=params)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == WEATHER_HTTP_RETRIES:
+                    return response
+                logger.warning(f"AccuWeather returned {response.status_code}, retrying ({attempt + 1}/{WEATHER_HTTP_RETRIES})")
+            except httpx.TransportError as e:
+                if attempt == WEATHER_HTTP_RETRIES:
+                    raise
+                logger.warning(f"AccuWeather request failed: {e}, retrying ({attempt + 1}/{WEATHER_HTTP_RETRIES})")
+            await asyncio.sleep(WEATHER_HTTP_BACKOFF * 2 ** attempt * (0.5 + random.random()))
+    
+    async def get_weather_data(self, location_key=None):
+        """
+        Get weather data for location_key (default Kandugula), from cache when fresh.
+        If AccuWeather is unavailable the last good observation is returned instead
+        (check is_stale()); None means there is nothing to show.
+        """
+        location_key = location_key or self.location_key
+        self._ensure_refresher()
+        weather_data = self.get_cached_weather(location_key)
+        if weather_data:
+            access_log.note_cache('hit')
+            return weather_data
+        self._count('misses')
+        
+        # Near the daily quota, keep the remaining calls for locations we know nothing about
+        cached = self._cache_peek(location_key)
+        if cached and self.quota.cache_only():
+            self.quota.record_cache_only()
+            access_log.note_cache('stale')
+            return cached
+        access_log.note_cache('miss')
+        
+        try:
+            weather_data = await self.refresh(location_key)
+            self._touch(location_key)
+            return weather_data
+        except UpstreamUnavailable as e:
+            stale = self._cache_peek(location_key)
+            if stale and self.cache_age(stale) < self.stale_ttl:
+                logger.warning(f"Serving stale weather for {location_key}: {e}")
+                self._count('stale_served')
+                access_log.note_cache('stale')
+                return stale
+            logger.error(f"No weather data for {location_key}: {e}")
+            return None
+    
+    async def refresh(self, location_key):
+        """
+        Fetch location_key upstream and cache the result (None if AccuWeather has no data).
+        Concurrent calls for the same key wait for a single upstream fetch.
+        """
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(location_key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._refresh(location_key))
+            inflight[location_key] = task
+            task.add_done_callback(lambda done: inflight.get(location_key) is done and inflight.pop(location_key))
+        else:
+            self._count('coalesced')
+        # Shielded so one caller giving up does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+    
+    async def _refresh(self, location_key):
+        if self.quota.exhausted():
+            raise UpstreamUnavailable("daily AccuWeather quota used up")
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise UpstreamUnavailable("circuit open")
+        trial = self.breaker.state == 'half_open'
+        try:
+            weather_data = await self.fetch_weather_data(location_key)
+        finally:
+            if trial:
+                self.breaker.end_trial()
+        if weather_data:
+            self._store(location_key, weather_data)
+            self._append_history(weather_data)
+        return weather_data
+    
+    def _append_history(self, weather_data):
+        try:
+            self.observation_store.append(weather_data.location_key, weather_data.observed_at, weather_data.to_dict())
+        except Exception as e:
+            logger.error(f"Error recording weather history for {weather_data.location_key}: {e}")
+    
+    def _store(self, location_key, weather_data):
+        with self._cache_lock:
+            self._cache[location_key] = weather_data
+            self._cache.move_to_end(location_key)
+            while len(self._cache) > self.cache_max_entries:
+                evicted, _ = self._cache.popitem(last=False)
+                self._last_access.pop(evicted, None)
+                self.stats['evictions'] += 1
+    
+    def _cache_peek(self, location_key):
+        with self._cache_lock:
+            return self._cache.get(location_key)
     
-    def get_weather_data(self):
+    def _touch(self, location_key):
+        # Only cached keys are tracked (and dropped with them), so unknown keys cannot grow this
+        with self._cache_lock:
+            if location_key in self._cache:
+                self._last_access[location_key] = time.monotonic()
+    
+    def get_cached_weather(self, location_key):
+        """Fresh cached weather data for location_key, or None"""
+        with self._cache_lock:
+            weather_data = self._cache.get(location_key)
+            if weather_data is not None:
+                self._last_access[location_key] = time.monotonic()
+            if weather_data and self.cache_age(weather_data) < self.cache_ttl:
+                self._cache.move_to_end(location_key)
+                self.stats['hits'] += 1
+                return weather_data
+        return None
+    
+    def is_stale(self, weather_data):
+        """True if weather_data is past its TTL (served because AccuWeather failed)"""
+        return self.cache_age(weather_data) >= self.cache_ttl
+    
+    def _ensure_refresher(self):
+        """Start the background refresher on the running event loop, once"""
+        if WEATHER_REFRESH_INTERVAL <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._refreshers.get(loop)
+        if task is None or task.done():
+            # Fresh context: refreshes must not be attributed to the tool call that started them
+            self._refreshers[loop] = loop.create_task(self._refresh_loop(), context=contextvars.Context())
+    
+    def _refresh_candidates(self):
+        """Hot locations whose cached data is about to expire"""
+        now = time.monotonic()
+        with self._cache_lock:
+            return [
+                key for key, weather_data in self._cache.items()
+                if now - self._last_access.get(key, float('-inf')) < WEATHER_HOT_WINDOW
+                and self.cache_age(weather_data) >= self.cache_ttl * WEATHER_REFRESH_AHEAD
+            ]
+    
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(WEATHER_REFRESH_INTERVAL)
+            if self.quota.cache_only():
+                continue
+            for location_key in self._refresh_candidates():
+                try:
+                    if await self.refresh(location_key):
+                        self._count('background_refreshes')
+                except UpstreamUnavailable as e:
+                    logger.warning(f"Background weather refresh stopped: {e}")
+                    break
+                except Exception as e:
+                    logger.error(f"Background weather refresh of {location_key} failed: {e}")
+    
+    def warm_up(self):
+        """Load stored location metadata and today's quota usage before the first call"""
+        locations = self.location_store.load_all()
+        self.quota.cache_only()
+        logger.info(f"Weather warm-up: {locations} stored locations loaded")
+    
+    def cache_age(self, weather_data):
+        """Seconds since weather_data was fetched from AccuWeather"""
+        return time.time() - weather_data.fetched_at
+    
+    def cache_stats(self):
+        """Cache counters for the /metrics endpoint"""
+        with self._cache_lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._cache),
+                        max_entries=self.cache_max_entries,
+                        ttl_seconds=self.cache_ttl,
+                        stale_ttl_seconds=self.stale_ttl,
+                        circuit=self.breaker.snapshot(),
+                        hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else None)
+    
+    async def get_location_info(self, location_key):
+        """AccuWeather location metadata, from the local store when known"""
+        location_info = self.location_store.get(location_key)
+        if location_info is not None:
+            self._count('location_store_hits')
+            return location_info
+        
+        location_url = f"{self.base_url}/locations/v1/{location_key}"
+        location_params = {'apikey': self.accuweather_api_key}
+        
+        try:
+            location_response = await self._get(location_url, location_params, 'accuweather locations', location_key)
+        except httpx.HTTPError as e:
+            logger.warning(f"Error fetching AccuWeather location info: {e}")
+            return {}
+        if location_response.status_code != 200:
+            return {}
+        location_info = location_response.json()
+        self.location_store.put(location_key, location_info)
+        return location_info
+    
+    async def fetch_weather_data(self, location_key):
         """
-        Fetch weather data from AccuWeather API for Kandugula
+        Fetch weather data from AccuWeather API for a location key.
+        Raises UpstreamUnavailable on network errors and 429/5xx responses.
         """
         try:
             # AccuWeather Current Conditions API endpoint
-            current_conditions_url = f"{self.base_url}/currentconditions/v1/{self.location_key}"
+            current_conditions_url = f"{self.base_url}/currentconditions/v1/{location_key}"
             
             params = {
                 'apikey': self.accuweather_api_key,
                 'details': 'true'  # Get detailed information
             }
             
-            logger.info(f"Fetching current conditions for Kandugula (Location Key: {self.location_key})")
-            response = requests.get(current_conditions_url, params=params, timeout=10)
+            logger.info(f"Fetching current conditions for location key {location_key}")
+            async with self._fetch_slot():
+                # Current conditions and location name are independent, fetch them concurrently
+                response, location_info = await asyncio.gather(
+                    self._get(current_conditions_url, params, 'accuweather currentconditions', location_key),
+                    self.get_location_info(location_key)
+                )
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f"AccuWeather returned {response.status_code}")
+            self.breaker.record_success()
             response.raise_for_status()
             
             current_data = response.json()
@@ -51,86 +504,18 @@ class WeatherService:
                 logger.warning("No current weather data received from AccuWeather")
                 return None
             
-            # Get location name to confirm
-            location_url = f"{self.base_url}/locations/v1/{self.location_key}"
-            location_params = {'apikey': self.accuweather_api_key}
-            
-            location_response = requests.get(location_url, params=location_params, timeout=10)
-            location_info = location_response.json() if location_response.status_code == 200 else {}
+            # Current conditions returns an array
+            weather_data = WeatherObservation.from_accuweather(current_data[0], location_info, location_key)
             
-            # Extract weather information
-            weather_info = current_data[0]  # Current conditions returns an array
-            
-            weather_data = {
-                'location_name': location_info.get('LocalizedName', 'Kandugula'),
-                'observation_time': weather_info.get('LocalObservationDateTime'),
-                'condition': weather_info['WeatherText'],
-                'weather_icon': weather_info.get('WeatherIcon'),
-                'is_day_time': weather_info.get('IsDayTime'),
-                'has_precipitation': weather_info.get('HasPrecipitation'),
-                'precipitation_type': weather_info.get('PrecipitationType'),
-                
-                # Temperature data
-                'temperature': weather_info['Temperature']['Metric']['Value'],
-                'temperature_unit': weather_info['Temperature']['Metric']['Unit'],
-                'realfeel_temp': weather_info['RealFeelTemperature']['Metric']['Value'],
-                'realfeel_phrase': weather_info['RealFeelTemperature']['Metric'].get('Phrase'),
-                'realfeel_shade': weather_info.get('RealFeelTemperatureShade', {}).get('Metric', {}).get('Value'),
-                'realfeel_shade_phrase': weather_info.get('RealFeelTemperatureShade', {}).get('Metric', {}).get('Phrase'),
-                'apparent_temp': weather_info.get('ApparentTemperature', {}).get('Metric', {}).get('Value'),
-                'windchill_temp': weather_info.get('WindChillTemperature', {}).get('Metric', {}).get('Value'),
-                'wetbulb_temp': weather_info.get('WetBulbTemperature', {}).get('Metric', {}).get('Value'),
-                'wetbulb_globe_temp': weather_info.get('WetBulbGlobeTemperature', {}).get('Metric', {}).get('Value'),
-                
-                # Humidity and dew point
-                'humidity': weather_info.get('RelativeHumidity'),
-                'indoor_humidity': weather_info.get('IndoorRelativeHumidity'),
-                'dew_point': weather_info.get('DewPoint', {}).get('Metric', {}).get('Value'),
-                
-                # Wind data
-                'wind_speed': weather_info.get('Wind', {}).get('Speed', {}).get('Metric', {}).get('Value'),
-                'wind_direction': weather_info.get('Wind', {}).get('Direction', {}).get('Localized'),
-                'wind_degrees': weather_info.get('Wind', {}).get('Direction', {}).get('Degrees'),
-                'wind_gust': weather_info.get('WindGust', {}).get('Speed', {}).get('Metric', {}).get('Value'),
-                
-                # Atmospheric data
-                'pressure': weather_info.get('Pressure', {}).get('Metric', {}).get('Value'),
-                'pressure_tendency': weather_info.get('PressureTendency', {}).get('LocalizedText'),
-                'visibility': weather_info.get('Visibility', {}).get('Metric', {}).get('Value'),
-                'cloud_cover': weather_info.get('CloudCover'),
-                'ceiling': weather_info.get('Ceiling', {}).get('Metric', {}).get('Value'),
-                
-                # UV data
-                'uv_index': weather_info.get('UVIndex'),
-                'uv_index_float': weather_info.get('UVIndexFloat'),
-                'uv_text': weather_info.get('UVIndexText'),
-                
-                # Precipitation data
-                'precip_1hr': weather_info.get('Precip1hr', {}).get('Metric', {}).get('Value'),
-                'precip_past_hour': weather_info.get('PrecipitationSummary', {}).get('PastHour', {}).get('Metric', {}).get('Value'),
-                'precip_past_3hrs': weather_info.get('PrecipitationSummary', {}).get('Past3Hours', {}).get('Metric', {}).get('Value'),
-                'precip_past_6hrs': weather_info.get('PrecipitationSummary', {}).get('Past6Hours', {}).get('Metric', {}).get('Value'),
-                'precip_past_12hrs': weather_info.get('PrecipitationSummary', {}).get('Past12Hours', {}).get('Metric', {}).get('Value'),
-                'precip_past_24hrs': weather_info.get('PrecipitationSummary', {}).get('Past24Hours', {}).get('Metric', {}).get('Value'),
-                
-                # Temperature ranges
-                'temp_6hr_min': weather_info.get('TemperatureSummary', {}).get('Past6HourRange', {}).get('Minimum', {}).get('Metric', {}).get('Value'),
-                'temp_6hr_max': weather_info.get('TemperatureSummary', {}).get('Past6HourRange', {}).get('Maximum', {}).get('Metric', {}).get('Value'),
-                'temp_12hr_min': weather_info.get('TemperatureSummary', {}).get('Past12HourRange', {}).get('Minimum', {}).get('Metric', {}).get('Value'),
-                'temp_12hr_max': weather_info.get('TemperatureSummary', {}).get('Past12HourRange', {}).get('Maximum', {}).get('Metric', {}).get('Value'),
-                'temp_24hr_min': weather_info.get('TemperatureSummary', {}).get('Past24HourRange', {}).get('Minimum', {}).get('Metric', {}).get('Value'),
-                'temp_24hr_max': weather_info.get('TemperatureSummary', {}).get('Past24HourRange', {}).get('Maximum', {}).get('Metric', {}).get('Value'),
-                'temp_24hr_departure': weather_info.get('Past24HourTemperatureDeparture', {}).get('Metric', {}).get('Value'),
-                
-                # Links
-                'mobile_link': weather_info.get('MobileLink'),
-                'web_link': weather_info.get('Link')
-            }
-            
-            logger.info(f"Successfully fetched weather data for {weather_data['location_name']}")
+            logger.info(f"Successfully fetched weather data for {weather_data.location_name}")
             return weather_data
             
-        except requests.exceptions.RequestException as e:
+        except UpstreamUnavailable:
+            raise
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(str(e) or type(e).__name__) from e
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching AccuWeather API data: {e}")
             return None
         except KeyError as e:
@@ -418,6 +803,7 @@ class WeatherService:
 ══════════════════════════════
 📅 **{current_date}**
 ⏰ **Last Update:** {current_time}
+🗄️ **Fetched:** {describe_age(self.cache_age(weather_data))}{self.stale_notice(weather_data)}
 💡 **Weather Tips:** {' '.join(weather_tips[:2])}
 ══════════════════════════════
 
@@ -432,6 +818,12 @@ class WeatherService:
             logger.error(f"Error formatting comprehensive weather message: {e}")
             return f"❌ Error formatting weather data: {str(e)}"
     
+    def stale_notice(self, weather_data):
+        """Warning line for data served because AccuWeather is unavailable, else ''"""
+        if not self.is_stale(weather_data):
+            return ''
+        return "\n⚠️ **AccuWeather unavailable, showing the last good observation**"
+    
     def get_weather_emoji(self, condition):
         """Get appropriate emoji for weather condition"""
         condition_lower = condition.lower()
@@ -476,19 +868,78 @@ class WeatherService:
         else:
             return '🟣'  # Extreme
 
-# Create weather service instance
-weather_service = WeatherService()
+def describe_age(seconds):
+    """Human friendly cache age such as 'just now' or '12 min ago'"""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{seconds / 3600:.1f} h ago"
+
+def observation_summary(weather_data):
+    """The headline fields of a WeatherObservation as a small dict"""
+    return {
+        'location_key': weather_data.location_key,
+        'name': weather_data.location_name,
+        'condition': weather_data.condition,
+        'temperature': weather_data.temperature,
+        'unit': weather_data.temperature_unit,
+        'humidity': weather_data.humidity,
+        'wind_kmh': weather_data.wind_speed,
+        'observed': weather_data.observation_time,
+        'age_seconds': int(get_weather_service().cache_age(weather_data)),
+        'stale': get_weather_service().is_stale(weather_data)
+    }
+
+def observation_json(weather_data):
+    """Compact JSON for a WeatherObservation, with its age and whether it is stale"""
+    return json_codec.dumps(dict(weather_data.to_dict(compact=True),
+                                 age_seconds=int(get_weather_service().cache_age(weather_data)),
+                                 stale=get_weather_service().is_stale(weather_data)))
+
+# Created on first use, so a missing API key only fails the weather tools, not the import
+_weather_service = None
+_weather_service_lock = threading.Lock()
+
+def get_weather_service():
+    """The shared WeatherService, created on first use"""
+    global _weather_service
+    if _weather_service is None:
+        with _weather_service_lock:
+            if _weather_service is None:
+                service = WeatherService()
+                metrics.register('weather_cache', service.cache_stats)
+                metrics.register('weather_quota', service.quota.snapshot)
+                _weather_service = service
+    return _weather_service
+
+def warm_up():
+    """Create the weather service and load its stores before the first call"""
+    get_weather_service().warm_up()
+
+async def close():
+    """Stop background refreshes and close the upstream connections and stores (on server shutdown)"""
+    service = _weather_service
+    if service is not None:
+        await service.aclose()
+        service.location_store.close()
+        service.quota.store.close()
+    observation_store.close()
 
 @mcp.tool(
     name='get_current_weather',
-    description="Get comprehensive current weather conditions for Kandugula village from AccuWeather"
+    description="Get comprehensive current weather conditions for Kandugula village from AccuWeather. "
+                "Use format='json' for compact structured data instead of a formatted message"
 )
-def get_current_weather() -> str:
+async def get_current_weather(format: Literal['markdown', 'json'] = 'markdown') -> str:
     """Get current weather conditions with detailed information"""
     try:
-        weather_data = weather_service.get_weather_data()
+        weather_data = await get_weather_service().get_weather_data()
         if weather_data:
-            return weather_service.format_weather_message(weather_data)
+            if format == 'json':
+                return observation_json(weather_data)
+            with span('format'):
+                return get_weather_service().format_weather_message(weather_data)
         else:
             return "❌ Failed to fetch weather data from AccuWeather API"
     except Exception as e:
@@ -497,14 +948,17 @@ def get_current_weather() -> str:
 
 @mcp.tool(
     name='get_weather_summary',
-    description="Get a brief weather summary for Kandugula village"
+    description="Get a brief weather summary for Kandugula village. "
+                "Use format='json' for compact structured data instead of a formatted message"
 )
-def get_weather_summary() -> str:
+async def get_weather_summary(format: Literal['markdown', 'json'] = 'markdown') -> str:
     """Get a brief weather summary"""
     try:
-        weather_data = weather_service.get_weather_data()
+        weather_data = await get_weather_service().get_weather_data()
         if not weather_data:
             return "❌ Failed to fetch weather data from AccuWeather API"
+        if format == 'json':
+            return json_codec.dumps(observation_summary(weather_data))
         
         temp = weather_data.get('temperature', 'N/A')
         temp_unit = weather_data.get('temperature_unit', 'C')
@@ -512,7 +966,7 @@ def get_weather_summary() -> str:
         humidity = weather_data.get('humidity', 'N/A')
         wind_speed = weather_data.get('wind_speed', 'N/A')
         
-        weather_emoji = weather_service.get_weather_emoji(condition)
+        weather_emoji = get_weather_service().get_weather_emoji(condition)
         
         summary = f"""🌤️ **KANDUGULA WEATHER SUMMARY**
         
@@ -521,7 +975,8 @@ def get_weather_summary() -> str:
 💧 **Humidity:** {humidity}%
 💨 **Wind:** {wind_speed} km/h
         
-⏰ **Updated:** {datetime.now().strftime('%H:%M')}"""
+⏰ **Updated:** {datetime.now().strftime('%H:%M')}
+🗄️ **Fetched:** {describe_age(get_weather_service().cache_age(weather_data))}{get_weather_service().stale_notice(weather_data)}"""
         
         return summary
         
@@ -531,22 +986,20 @@ def get_weather_summary() -> str:
 
 @mcp.tool(
     name='get_weather_by_location',
-    description="Get weather data for a specific location using AccuWeather location key"
+    description="Get weather data for a specific location using AccuWeather location key. "
+                "Use format='json' for compact structured data instead of a formatted message"
 )
-def get_weather_by_location(location_key: str = Field(description="AccuWeather location key")) -> str:
+async def get_weather_by_location(location_key: str = Field(description="AccuWeather location key"),
+                                  format: Literal['markdown', 'json'] = 'markdown') -> str:
     """Get weather data for a specific location"""
     try:
-        # Temporarily override the location key
-        original_key = weather_service.location_key
-        weather_service.location_key = location_key
-        
-        weather_data = weather_service.get_weather_data()
-        
-        # Restore original location key
-        weather_service.location_key = original_key
+        weather_data = await get_weather_service().get_weather_data(location_key)
         
         if weather_data:
-            return weather_service.format_weather_message(weather_data)
+            if format == 'json':
+                return observation_json(weather_data)
+            with span('format'):
+                return get_weather_service().format_weather_message(weather_data)
         else:
             return f"❌ Failed to fetch weather data for location key: {location_key}"
             
@@ -554,5 +1007,91 @@ def get_weather_by_location(location_key: str = Field(description="AccuWeather l
         logger.error(f"Error in get_weather_by_location: {e}")
         return f"❌ Error getting weather data for location {location_key}: {str(e)}"
 
+@mcp.tool(
+    name='get_weather_for_locations',
+    description="Get a compact weather summary for several AccuWeather location keys in one call"
+)
+async def get_weather_for_locations(location_keys: list[str] = Field(description="AccuWeather location keys")) -> str:
+    """Fetch several locations concurrently, answering from cache where possible"""
+    keys = list(dict.fromkeys(key.strip() for key in location_keys if key and key.strip()))
+    if not keys:
+        return "❌ Provide at least one location key"
+    if len(keys) > WEATHER_BATCH_MAX_LOCATIONS:
+        return f"❌ At most {WEATHER_BATCH_MAX_LOCATIONS} location keys per call"
+    
+    # Cached locations are answered immediately; only misses queue for the service's upstream cap
+    cached = {key: get_weather_service().get_cached_weather(key) for key in keys}
+    
+    async def fetch(key):
+        if cached[key]:
+            return key, cached[key], None
+        try:
+            return key, await get_weather_service().get_weather_data(key), None
+        except Exception as e:
+            return key, None, str(e)
+    
+    results = await asyncio.gather(*(fetch(key) for key in keys))
+    
+    hits = sum(1 for key in keys if cached[key])
+    access_log.note_cache('hit' if hits == len(keys) else 'miss' if hits == 0 else 'partial')
+    
+    locations = []
+    failed = []
+    for key, weather_data, error in results:
+        if not weather_data:
+            failed.append({'location_key': key, 'error': error or "No data from AccuWeather"})
+            continue
+        locations.append(observation_summary(weather_data))
+    
+    return json_codec.dumps({'locations': locations, 'failed': failed})
+
+def parse_history_time(value, default):
+    """Epoch seconds for a YYYY-MM-DD or ISO 8601 string (UTC unless it has an offset)"""
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@mcp.tool(
+    name='get_weather_history',
+    description="Get recorded weather for an AccuWeather location key between two dates, bucketed by hour, day or week. "
+                "Answered from locally stored observations, so it costs no API calls"
+)
+def get_weather_history(
+    location_key: str = Field(description="AccuWeather location key"),
+    start: Optional[str] = Field(None, description="Start date or time (YYYY-MM-DD or ISO 8601, UTC), defaults to 7 days ago"),
+    end: Optional[str] = Field(None, description="End date or time (exclusive), defaults to now"),
+    granularity: Literal['raw', 'hour', 'day', 'week'] = Field(default='hour', description="Bucket size, or 'raw' for individual observations")
+) -> str:
+    """Bucketed observation history from the local store"""
+    try:
+        now = time.time()
+        start_ts = parse_history_time(start, now - 7 * 86400)
+        end_ts = parse_history_time(end, now)
+    except ValueError:
+        return "❌ Invalid date. Use YYYY-MM-DD or an ISO 8601 date and time"
+    if start_ts >= end_ts:
+        return "❌ start must be before end"
+    
+    try:
+        with span('history', location_key=location_key, granularity=granularity):
+            rows = observation_store.history(location_key, start_ts, end_ts, granularity)
+    except Exception as e:
+        logger.error(f"Error in get_weather_history: {e}")
+        return f"❌ Error reading weather history: {str(e)}"
+    
+    key = 'observed_at' if granularity == 'raw' else 'bucket'
+    for row in rows:
+        row[key] = datetime.fromtimestamp(row[key], timezone.utc).isoformat(timespec='seconds')
+    return json_codec.dumps({
+        'location_key': location_key,
+        'granularity': granularity,
+        'start': datetime.fromtimestamp(start_ts, timezone.utc).isoformat(timespec='seconds'),
+        'end': datetime.fromtimestamp(end_ts, timezone.utc).isoformat(timespec='seconds'),
+        'rows': rows
+    })
+
 if __name__ == "__main__":
     mcp.run(transport='sse')
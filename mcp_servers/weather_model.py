@@ -0,0 +1,134 @@
+"""Parsed AccuWeather current conditions.
+
+``WeatherObservation`` holds the fields the weather tools use, extracted
+once from the AccuWeather payload by walking the paths in ``FIELDS`` and
+then kept in the cache as-is. It supports ``obs.get('field')`` and
+``obs['field']`` so code written against the old dict keeps working.
+"""
+import time
+from datetime import datetime
+
+# (attribute, path into a currentconditions entry, required)
+FIELDS = (
+    ('observation_time', ('LocalObservationDateTime',), False),
+    ('condition', ('WeatherText',), True),
+    ('weather_icon', ('WeatherIcon',), False),
+    ('is_day_time', ('IsDayTime',), False),
+    ('has_precipitation', ('HasPrecipitation',), False),
+    ('precipitation_type', ('PrecipitationType',), False),
+
+    # Temperature data
+    ('temperature', ('Temperature', 'Metric', 'Value'), True),
+    ('temperature_unit', ('Temperature', 'Metric', 'Unit'), True),
+    ('realfeel_temp', ('RealFeelTemperature', 'Metric', 'Value'), True),
+    ('realfeel_phrase', ('RealFeelTemperature', 'Metric', 'Phrase'), False),
+    ('realfeel_shade', ('RealFeelTemperatureShade', 'Metric', 'Value'), False),
+    ('realfeel_shade_phrase', ('RealFeelTemperatureShade', 'Metric', 'Phrase'), False),
+    ('apparent_temp', ('ApparentTemperature', 'Metric', 'Value'), False),
+    ('windchill_temp', ('WindChillTemperature', 'Metric', 'Value'), False),
+    ('wetbulb_temp', ('WetBulbTemperature', 'Metric', 'Value'), False),
+    ('wetbulb_globe_temp', ('WetBulbGlobeTemperature', 'Metric', 'Value'), False),
+
+    # Humidity and dew point
+    ('humidity', ('RelativeHumidity',), False),
+    ('indoor_humidity', ('IndoorRelativeHumidity',), False),
+    ('dew_point', ('DewPoint', 'Metric', 'Value'), False),
+
+    # Wind data
+    ('wind_speed', ('Wind', 'Speed', 'Metric', 'Value'), False),
+    ('wind_direction', ('Wind', 'Direction', 'Localized'), False),
+    ('wind_degrees', ('Wind', 'Direction', 'Degrees'), False),
+    ('wind_gust', ('WindGust', 'Speed', 'Metric', 'Value'), False),
+
+    # Atmospheric data
+    ('pressure', ('Pressure', 'Metric', 'Value'), False),
+    ('pressure_tendency', ('PressureTendency', 'LocalizedText'), False),
+    ('visibility', ('Visibility', 'Metric', 'Value'), False),
+    ('cloud_cover', ('CloudCover',), False),
+    ('ceiling', ('Ceiling', 'Metric', 'Value'), False),
+
+    # UV data
+    ('uv_index', ('UVIndex',), False),
+    ('uv_index_float', ('UVIndexFloat',), False),
+    ('uv_text', ('UVIndexText',), False),
+
+    # Precipitation data
+    ('precip_1hr', ('Precip1hr', 'Metric', 'Value'), False),
+    ('precip_past_hour', ('PrecipitationSummary', 'PastHour', 'Metric', 'Value'), False),
+    ('precip_past_3hrs', ('PrecipitationSummary', 'Past3Hours', 'Metric', 'Value'), False),
+    ('precip_past_6hrs', ('PrecipitationSummary', 'Past6Hours', 'Metric', 'Value'), False),
+    ('precip_past_12hrs', ('PrecipitationSummary', 'Past12Hours', 'Metric', 'Value'), False),
+    ('precip_past_24hrs', ('PrecipitationSummary', 'Past24Hours', 'Metric', 'Value'), False),
+
+    # Temperature ranges
+    ('temp_6hr_min', ('TemperatureSummary', 'Past6HourRange', 'Minimum', 'Metric', 'Value'), False),
+    ('temp_6hr_max', ('TemperatureSummary', 'Past6HourRange', 'Maximum', 'Metric', 'Value'), False),
+    ('temp_12hr_min', ('TemperatureSummary', 'Past12HourRange', 'Minimum', 'Metric', 'Value'), False),
+    ('temp_12hr_max', ('TemperatureSummary', 'Past12HourRange', 'Maximum', 'Metric', 'Value'), False),
+    ('temp_24hr_min', ('TemperatureSummary', 'Past24HourRange', 'Minimum', 'Metric', 'Value'), False),
+    ('temp_24hr_max', ('TemperatureSummary', 'Past24HourRange', 'Maximum', 'Metric', 'Value'), False),
+    ('temp_24hr_departure', ('Past24HourTemperatureDeparture', 'Metric', 'Value'), False),
+
+    # Links
+    ('mobile_link', ('MobileLink',), False),
+    ('web_link', ('Link',), False),
+)
+
+
+def extract(payload, path, required=False):
+    """Follow path into nested dicts; a missing step is None, or KeyError when required"""
+    value = payload
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            if required:
+                raise KeyError('.'.join(path))
+            return None
+        value = value[key]
+    return value
+
+
+class WeatherObservation:
+    """One AccuWeather current conditions observation for a location"""
+
+    __slots__ = ('location_key', 'location_name', 'fetched_at') + tuple(name for name, _, _ in FIELDS)
+
+    def __init__(self, location_key, location_name, fetched_at=None, **fields):
+        self.location_key = location_key
+        self.location_name = location_name
+        # When this observation was fetched, used for cache age
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        for name, _, _ in FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_accuweather(cls, current, location_info, location_key, fetched_at=None):
+        """Parse a currentconditions entry plus /locations metadata (KeyError on missing essentials)"""
+        fields = {name: extract(current, path, required) for name, path, required in FIELDS}
+        return cls(location_key, location_info.get('LocalizedName', 'Kandugula'), fetched_at, **fields)
+
+    @property
+    def observed_at(self):
+        """Epoch seconds of the observation itself, falling back to when it was fetched"""
+        if self.observation_time:
+            try:
+                return datetime.fromisoformat(self.observation_time).timestamp()
+            except ValueError:
+                pass
+        return self.fetched_at
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def to_dict(self, compact=False):
+        """Plain dict of every field; compact=True leaves out empty ones"""
+        return {name: getattr(self, name) for name in self.__slots__
+                if not compact or getattr(self, name) is not None}
+
+    def __repr__(self):
+        return f"WeatherObservation({self.location_key!r}, {self.condition!r}, {self.temperature}°{self.temperature_unit})"
@@ -0,0 +1,215 @@
+"""Local SQLite storage for the weather service.
+
+Data kept here survives restarts; the database file is only opened when it
+is first needed.
+
+    WEATHER_DB_PATH=weather.sqlite3
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+WEATHER_DB_PATH = os.getenv('WEATHER_DB_PATH', 'weather.sqlite3')
+
+
+class SQLiteStore:
+    """Lazily opened SQLite connection shared by the threads of one process"""
+
+    SCHEMA = ''
+
+    def __init__(self, path=WEATHER_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class LocationStore(SQLiteStore):
+    """AccuWeather /locations payloads by location key.
+
+    Location metadata (names, coordinates, time zone) practically never
+    changes, so it is fetched from AccuWeather once per key and then read
+    from disk, with an in-memory copy in front.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS locations (
+            location_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, path=WEATHER_DB_PATH):
+        super().__init__(path)
+        self._memory = {}
+
+    def get(self, location_key):
+        """Stored payload for location_key, or None on a first-ever miss"""
+        payload = self._memory.get(location_key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT payload FROM locations WHERE location_key = ?', (location_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        self._memory[location_key] = payload
+        return payload
+
+    def put(self, location_key, payload):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO locations (location_key, payload, fetched_at) VALUES (?, ?, ?)',
+                    (location_key, json.dumps(payload), time.time())
+                )
+        self._memory[location_key] = payload
+
+    def load_all(self):
+        """Read every stored location into memory; returns how many were loaded"""
+        with self._lock:
+            rows = self._connect().execute('SELECT location_key, payload FROM locations').fetchall()
+        for location_key, payload in rows:
+            self._memory[location_key] = json.loads(payload)
+        return len(rows)
+
+
+class QuotaStore(SQLiteStore):
+    """Upstream API calls per (hashed) API key and UTC day, kept across restarts"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS quota_usage (
+            key_hash TEXT NOT NULL,
+            day TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            PRIMARY KEY (key_hash, day)
+        );
+    '''
+
+    def usage(self, key_hash, day):
+        """Calls recorded for key_hash on day (YYYY-MM-DD)"""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT calls FROM quota_usage WHERE key_hash = ? AND day = ?', (key_hash, day)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, key_hash, day, quota):
+        """Count one call on day if fewer than quota are recorded; returns the new total, or None if refused.
+
+        The check and the increment are one statement, so processes sharing
+        the file cannot together go over the quota.
+        """
+        if quota <= 0:
+            return None
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                changed = conn.execute(
+                    'INSERT INTO quota_usage (key_hash, day, calls) VALUES (?, ?, 1) '
+                    'ON CONFLICT (key_hash, day) DO UPDATE SET calls = calls + 1 WHERE calls < ?',
+                    (key_hash, day, quota)
+                ).rowcount
+                if not changed:
+                    return None
+                return conn.execute(
+                    'SELECT calls FROM quota_usage WHERE key_hash = ? AND day = ?', (key_hash, day)
+                ).fetchone()[0]
+
+
+class ObservationStore(SQLiteStore):
+    """Time series of fetched observations, one row per location and observation time.
+
+    Every upstream fetch is appended here, so history questions are answered
+    locally (with SQL bucketing) instead of spending API quota.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS observations (
+            location_key TEXT NOT NULL,
+            observed_at REAL NOT NULL,
+            condition TEXT,
+            temperature REAL,
+            realfeel_temp REAL,
+            humidity REAL,
+            wind_speed REAL,
+            pressure REAL,
+            uv_index REAL,
+            precip_1hr REAL,
+            PRIMARY KEY (location_key, observed_at)
+        ) WITHOUT ROWID;
+    '''
+
+    # Numeric columns averaged / ranged when bucketing
+    MEASURES = ('temperature', 'realfeel_temp', 'humidity', 'wind_speed', 'pressure', 'uv_index', 'precip_1hr')
+
+    # Bucket width in seconds per granularity ('raw' returns individual rows)
+    BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+    def append(self, location_key, observed_at, values):
+        """Record one observation; an observation already stored is ignored"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR IGNORE INTO observations (location_key, observed_at, condition, '
+                    + ', '.join(self.MEASURES) + ') VALUES (?, ?, ?' + ', ?' * len(self.MEASURES) + ')',
+                    (location_key, observed_at, values.get('condition'))
+                    + tuple(values.get(name) for name in self.MEASURES)
+                )
+
+    def history(self, location_key, start, end, granularity='hour', limit=1000):
+        """Observations for location_key with start <= observed_at < end (epoch seconds).
+
+        With granularity 'hour', 'day' or 'week' rows are grouped into UTC
+        buckets by SQLite and each bucket reports the count and the average,
+        minimum and maximum of every measure.
+        """
+        if granularity == 'raw':
+            sql = ('SELECT observed_at, condition, ' + ', '.join(self.MEASURES) + ' FROM observations '
+                   'WHERE location_key = ? AND observed_at >= ? AND observed_at < ? ORDER BY observed_at LIMIT ?')
+            params = (location_key, start, end, limit)
+        elif granularity in self.BUCKETS:
+            aggregates = ', '.join(f'AVG({name}), MIN({name}), MAX({name})' for name in self.MEASURES)
+            sql = (f'SELECT CAST(observed_at / :width AS INTEGER) * :width AS bucket, COUNT(*), {aggregates} '
+                   'FROM observations WHERE location_key = :key AND observed_at >= :start AND observed_at < :end '
+                   'GROUP BY bucket ORDER BY bucket LIMIT :limit')
+            params = {'width': self.BUCKETS[granularity], 'key': location_key, 'start': start, 'end': end, 'limit': limit}
+        else:
+            raise ValueError(f"granularity must be one of raw, {', '.join(self.BUCKETS)}")
+
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+
+        if granularity == 'raw':
+            return [dict(zip(('observed_at', 'condition') + self.MEASURES, row)) for row in rows]
+        buckets = []
+        for row in rows:
+            bucket = {'bucket': row[0], 'observations': row[1]}
+            for i, name in enumerate(self.MEASURES):
+                avg, low, high = row[2 + 3 * i:5 + 3 * i]
+                if avg is not None:
+                    bucket[name] = {'avg': round(avg, 2), 'min': low, 'max': high}
+            buckets.append(bucket)
+        return buckets
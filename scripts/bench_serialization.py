@@ -0,0 +1,75 @@
+"""Compare encodings of a large expense-tool result.
+
+Builds a synthetic ``get_my_expenses``-style payload and reports encode time
+and size for the old ``json.dumps(indent=2)``, the compact encoder the tools
+now use, and that output compressed the way the HTTP server sends it.
+
+    python scripts/bench_serialization.py --expenses 5000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi_server.compression import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, brotli
+from mcp_servers import json_codec
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Groceries', 'Bills', 'Health', 'Other']
+DESCRIPTIONS = ['coffee', 'lunch', 'uber ride', 'movie night', 'weekly groceries', 'electric bill', 'pharmacy', 'gift']
+
+
+def payload(count, rng):
+    start = datetime(2024, 1, 1)
+    expenses = [{
+        'id': f"{rng.getrandbits(96):024x}",
+        'category': rng.choice(CATEGORIES),
+        'amount': round(rng.uniform(1, 200), 2),
+        'date': (start + timedelta(minutes=rng.randrange(525600))).strftime('%Y-%m-%d'),
+        'description': rng.choice(DESCRIPTIONS),
+    } for _ in range(count)]
+    return {'user': 'bench', 'total_expenses': count, 'expenses': expenses}
+
+
+def timed(fn, runs):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=5000, help="Expenses in the payload")
+    parser.add_argument('--runs', type=int, default=5, help="Best of this many runs")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    data = payload(args.expenses, random.Random(args.seed))
+    encoder = 'orjson' if json_codec.orjson is not None else 'json'
+    rows = [
+        ('json indent=2', lambda: json.dumps(data, indent=2)),
+        (f"compact ({encoder})", lambda: json_codec.dumps(data, pretty=False)),
+    ]
+    print(f"{args.expenses} expenses")
+    for label, encode in rows:
+        text, seconds = timed(encode, args.runs)
+        print(f"  {label:<24} {seconds * 1000:8.2f} ms  {len(text.encode('utf-8')):>10,} bytes")
+
+    body = json_codec.dumps(data, pretty=False).encode('utf-8')
+    compressed, seconds = timed(lambda: gzip.compress(body, COMPRESSION_GZIP_LEVEL), args.runs)
+    print(f"  {'+ gzip':<24} {seconds * 1000:8.2f} ms  {len(compressed):>10,} bytes on the wire")
+    if brotli is not None:
+        compressed, seconds = timed(lambda: brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY), args.runs)
+        print(f"  {'+ br':<24} {seconds * 1000:8.2f} ms  {len(compressed):>10,} bytes on the wire")
+
+
+if __name__ == '__main__':
+    main()
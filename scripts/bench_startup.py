@@ -0,0 +1,115 @@
+"""Measure how long the combined server takes to start.
+
+Every measurement runs in a fresh interpreter, so nothing is already imported:
+
+- import: ``import fastapi_server.server`` (what runs before the port is bound);
+- service: importing one MCP server and building its SSE app (what its first
+  request, or the background warm-up, pays);
+- serve: with ``--serve``, launching uvicorn until ``/healthz`` answers.
+
+    python scripts/bench_startup.py --runs 5 --serve --importtime 15
+
+Reports the median and best of ``--runs``. Run it before and after changing
+imports to catch start-up regressions.
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from fastapi_server.services import SERVICES
+
+TIMED_IMPORT = '''
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+'''
+
+
+def child_env(tmp):
+    env = dict(os.environ, PYTHONPATH=ROOT, ACCESS_LOG='', WEATHER_DB_PATH=os.path.join(tmp, 'weather.sqlite3'))
+    # Start-up must not depend on these, so measure without them
+    env.pop('MONGO_URI', None)
+    env.pop('ACCUWEATHER_API_KEY', None)
+    return env
+
+
+def timed(code, env):
+    """Seconds a fresh interpreter spends running code"""
+    output = subprocess.run([sys.executable, '-c', TIMED_IMPORT.format(code=code)], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def time_to_healthz(env, timeout=60):
+    """Seconds from launching uvicorn until GET /healthz succeeds"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'fastapi_server.server:app', '--port', str(port),
+                                '--log-level', 'warning'], env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/healthz did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_profile(env, top):
+    """The slowest modules imported directly by the server module by cumulative time (-X importtime)"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import fastapi_server.server'],
+                            env=env, cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if match and len(match[3]) == 3:
+            rows.append((int(match[2]), match[4]))
+    return sorted(rows, reverse=True)[:top]
+
+
+def report(label, samples):
+    print(f"{label:<28} median {statistics.median(samples) * 1000:8.1f} ms   best {min(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument('--serve', action='store_true', help="Also time uvicorn until /healthz answers")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="Show the N slowest modules imported directly by the server module")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(tmp)
+        report('import server', [timed('import fastapi_server.server', env) for _ in range(args.runs)])
+        for name, module in SERVICES.items():
+            code = f"import {module} as m\nm.mcp.sse_app()"
+            report(f"load {name}", [timed(code, env) for _ in range(args.runs)])
+        if args.serve:
+            report('uvicorn to /healthz', [time_to_healthz(env) for _ in range(args.runs)])
+        if args.importtime:
+            print("\nslowest imports of fastapi_server.server (cumulative):")
+            for micros, module in import_profile(env, args.importtime):
+                print(f"  {micros / 1000:8.1f} ms  {module}")
+
+
+if __name__ == '__main__':
+    main()
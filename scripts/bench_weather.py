@@ -0,0 +1,135 @@
+"""Benchmark the weather tools against the local AccuWeather stand-in.
+
+Starts ``scripts/fake_accuweather.py`` in-process, points the weather server
+at it and runs two phases:
+
+- burst: ``--concurrency`` callers ask for the same cold location at once,
+  which should cost a single upstream fetch (request coalescing);
+- load: ``--requests`` tool calls from ``--concurrency`` workers over
+  ``--locations`` keys with a skewed (Zipf-like) popularity, reporting
+  throughput, latency percentiles, cache hit rate and upstream calls.
+
+    python scripts/bench_weather.py --requests 5000 --concurrency 50 --latency-ms 150
+
+Nothing touches the real API or the regular weather.sqlite3 file.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.fake_accuweather import serve_in_background
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def zipf_keys(count, requests, skew, rng):
+    """Location keys for ``requests`` calls, key i chosen with weight 1 / (i + 1) ** skew"""
+    keys = [str(100000 + i) for i in range(count)]
+    weights = [1 / (i + 1) ** skew for i in range(count)]
+    return rng.choices(keys, weights=weights, k=requests)
+
+
+async def burst(wm, fake, concurrency):
+    before = fake.stats().get('currentconditions', 0)
+    start = time.perf_counter()
+    await asyncio.gather(*(wm.get_weather_by_location('999999') for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    upstream = fake.stats().get('currentconditions', 0) - before
+    print(f"burst: {concurrency} concurrent callers for one cold location -> "
+          f"{upstream} upstream fetch(es) in {elapsed * 1000:.1f} ms")
+
+
+async def load(wm, keys, concurrency):
+    latencies = []
+    failures = 0
+    queue = asyncio.Queue()
+    for key in keys:
+        queue.put_nowait(key)
+
+    async def worker():
+        nonlocal failures
+        while not queue.empty():
+            key = queue.get_nowait()
+            start = time.perf_counter()
+            result = await wm.get_weather_by_location(key)
+            latencies.append(time.perf_counter() - start)
+            failures += result.startswith('❌')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, failures
+
+
+async def run(args, fake):
+    from mcp_servers import weather_mcp as wm
+
+    # Per-fetch INFO lines would dominate the run
+    logging.disable(logging.INFO)
+    service = wm.get_weather_service()
+    await burst(wm, fake, args.concurrency)
+
+    keys = zipf_keys(args.locations, args.requests, args.skew, random.Random(args.seed))
+    stats_before = service.cache_stats()
+    upstream_before = fake.stats()
+    elapsed, latencies, failures = await load(wm, keys, args.concurrency)
+    stats = service.cache_stats()
+    upstream = fake.stats()
+    await service.aclose()
+
+    hits = stats['hits'] - stats_before['hits']
+    misses = stats['misses'] - stats_before['misses']
+    print(f"load:  {len(latencies)} calls over {args.locations} locations, concurrency {args.concurrency}")
+    print(f"       throughput   {len(latencies) / elapsed:,.0f} calls/s ({elapsed:.2f} s)")
+    print(f"       latency ms   p50 {percentile(latencies, 0.5) * 1000:.2f}  p95 {percentile(latencies, 0.95) * 1000:.2f}"
+          f"  p99 {percentile(latencies, 0.99) * 1000:.2f}  mean {statistics.fmean(latencies) * 1000:.2f}")
+    print(f"       cache        {hits} hits, {misses} misses, hit rate {hits / max(hits + misses, 1):.1%}")
+    print(f"       coalesced    {stats['coalesced'] - stats_before['coalesced']} callers shared an in-flight fetch")
+    for endpoint in ('currentconditions', 'locations', 'errors'):
+        print(f"       upstream     {endpoint:<18} {upstream.get(endpoint, 0) - upstream_before.get(endpoint, 0)}")
+    print(f"       failed calls {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help="Tool calls in the load phase")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent callers")
+    parser.add_argument('--locations', type=int, default=20, help="Distinct location keys")
+    parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of location popularity")
+    parser.add_argument('--latency-ms', type=float, default=100, help="Fake AccuWeather response delay")
+    parser.add_argument('--error-rate', type=float, default=0, help="Share of failed fake responses")
+    parser.add_argument('--ttl', type=int, default=900, help="WEATHER_CACHE_TTL for the run")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    fake = serve_in_background(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        # The weather server reads its settings at import time
+        os.environ.update({
+            'ACCUWEATHER_BASE_URL': fake.base_url,
+            'WEATHER_DB_PATH': os.path.join(tmp, 'weather.sqlite3'),
+            'WEATHER_CACHE_TTL': str(args.ttl),
+            'WEATHER_REFRESH_INTERVAL': '0',
+            'WEATHER_DAILY_QUOTA': str(10 ** 9),
+            'ACCESS_LOG': '',
+        })
+        os.environ.pop('ACCUWEATHER_API_KEY', None)
+        try:
+            asyncio.run(run(args, fake))
+        finally:
+            fake.shutdown()
+            fake.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Check the calculator tools end to end, through FastMCP's input and output validation.
+
+Each case calls a tool the way a client does (``mcp.call_tool``), so a result
+the engine accepts but the tool's declared output type rejects shows up as a
+failure. Exits non-zero if any case gives a different result or error.
+
+    python scripts/check_calculator.py
+"""
+import asyncio
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_servers import eval_expression
+
+# (tool, arguments, expected result, or an error substring prefixed with '!')
+CASES = [
+    ('calculator', {'math_exp': '2 + 3 * 4'}, 14),
+    ('calculator', {'math_exp': '2 ** 0.5'}, math.sqrt(2)),
+    ('calculator', {'math_exp': 'x / 4', 'variables': {'x': 10}}, 2.5),
+    # Integers wider than a float (> 1024 bits) but within CALC_MAX_INT_BITS
+    ('calculator', {'math_exp': '2 ** 1500'}, 2 ** 1500),
+    ('calculator', {'math_exp': 'factorial(536)'}, math.factorial(536)),
+    ('calculator', {'math_exp': '(-8) ** 0.5'}, '!not a real number'),
+    ('calculator', {'math_exp': '1e308 * 10'}, '!not a finite number'),
+    ('calculator', {'math_exp': 'factorial(700)'}, '!limited to n <= 536'),
+    ('calculator', {'math_exp': 'round(5, -10000000)'}, 0),
+    ('calculator', {'math_exp': 'lcm(2 ** 4000, 3 ** 2000)'}, '!exceeds 4096 bits'),
+    # One refused row is null, the others are still computed
+    ('calculate_batch', {'expression': 'factorial(n)', 'variables': {'n': [3, 5.5, 4, 600]}},
+     {'count': 4, 'results': [6.0, None, 24.0, None], 'invalid': 2}),
+]
+
+
+def result_of(tool, content, structured):
+    if tool == 'calculate_batch':
+        return json.loads(content[0].text)
+    return structured['result']
+
+
+async def run():
+    failures = 0
+    for tool, arguments, expected in CASES:
+        try:
+            content, structured = await eval_expression.mcp.call_tool(tool, arguments)
+            outcome = result_of(tool, content, structured)
+            ok = not isinstance(expected, str) and (
+                math.isclose(outcome, expected) if isinstance(expected, float) else outcome == expected)
+        except Exception as e:
+            outcome = f"error: {e}"
+            ok = isinstance(expected, str) and expected[1:] in str(e)
+        failures += not ok
+        shown = str(outcome)
+        print(f"{'ok  ' if ok else 'FAIL'} {tool} {arguments} -> {shown[:60]}{'...' if len(shown) > 60 else ''}")
+    eval_expression.close()
+    return failures
+
+
+def main():
+    failures = asyncio.run(run())
+    print(f"{len(CASES) - failures}/{len(CASES)} passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
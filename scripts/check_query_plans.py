@@ -0,0 +1,170 @@
+"""Check that every expense tracker tool is served by an index.
+
+Seeds a scratch database on a local ``mongod``, calls each tool through the
+same functions the MCP server registers, records every command the tools
+send and runs ``explain('executionStats')`` on it. Exits non-zero if any
+plan uses a collection scan, sorts raw documents in memory or examines too
+many documents per document returned.
+
+    python scripts/check_query_plans.py --uri mongodb://localhost:27017
+
+The scratch database is dropped afterwards unless ``--keep`` is given.
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, monitoring
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_servers.query_plans import EXPLAINABLE_COMMANDS, explain_command, plan_problems, plan_summary
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Groceries', 'Bills', 'Health', 'Other']
+DESCRIPTIONS = ['coffee', 'lunch', 'uber ride', 'movie night', 'weekly groceries', 'electric bill', 'pharmacy', 'gift']
+
+# Tools whose filters cannot be fully answered from an index. Unanchored
+# regexes and amount ranges are evaluated after the FETCH, so the examined
+# to returned ratio depends on the data rather than on the plan.
+RATIO_EXEMPT_TOOLS = {'find_my_expenses'}
+
+# Tools that only insert, so there is no query plan to check
+INSERT_ONLY_TOOLS = {'add_expense', 'quick_add_expense'}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Remember the explainable commands sent to one database, tagged with the running tool"""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.tool = None
+        self.commands = []
+
+    def started(self, event):
+        if self.tool and event.database_name == self.db_name and event.command_name in EXPLAINABLE_COMMANDS:
+            self.commands.append((self.tool, event.command_name, copy.deepcopy(dict(event.command))))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, user_ids, per_user):
+    """Insert ``per_user`` expenses for each user spread over the last ~400 days"""
+    now = datetime.now()
+    rng = random.Random(42)
+    docs = []
+    for user_id in user_ids:
+        for i in range(per_user):
+            # A handful of expenses land today so the 'today' tool has rows to return
+            days_back = 0 if i < 3 else rng.randint(0, 400)
+            docs.append({
+                'user_id': user_id,
+                'category': rng.choice(CATEGORIES),
+                'amount': round(rng.uniform(1, 250), 2),
+                'date': (now - timedelta(days=days_back)).replace(hour=rng.randint(0, 23), minute=rng.randint(0, 59)),
+                'description': rng.choice(DESCRIPTIONS),
+            })
+    db.expenses.insert_many(docs)
+
+
+def scenarios(et, expense_ids):
+    """(tool name, call) pairs covering the query shapes of every tool"""
+    now = datetime.now()
+    last_month = (now.replace(day=1) - timedelta(days=1))
+    return [
+        ('register', lambda: et.register('plan_check_other', 'secret')),
+        ('login', lambda: et.login('plan_check', 'secret')),
+        ('add_expense', lambda: et.add_expense('Food', 12.5, now.strftime('%Y-%m-%d'), 'plan check')),
+        ('get_my_expenses', lambda: et.get_my_expenses()),
+        ('get_my_expense_by_id', lambda: et.get_my_expense_by_id(expense_ids[0])),
+        ('update_my_expense', lambda: et.update_my_expense(expense_ids[1], None, 99.0, None, None)),
+        ('get_my_expenses_by_category', lambda: et.get_my_expenses_by_category('Food')),
+        ('get_my_monthly_report', lambda: et.get_my_monthly_report(last_month.year, last_month.month)),
+        ('get_my_expense_summary', lambda: et.get_my_expense_summary()),
+        ('quick_add_expense', lambda: et.quick_add_expense('coffee $4.50')),
+        ('get_my_today_expenses', lambda: et.get_my_today_expenses()),
+        ('get_my_week_summary', lambda: et.get_my_week_summary()),
+        ('find_my_expenses', lambda: et.find_my_expenses('coffee', None, None, None)),
+        ('find_my_expenses', lambda: et.find_my_expenses(None, 10.0, 50.0, 90)),
+        ('get_my_spending_trends', lambda: et.get_my_spending_trends()),
+        ('set_my_budget_alert', lambda: et.set_my_budget_alert('Food', 500.0, 'month')),
+        ('set_my_budget_alert', lambda: et.set_my_budget_alert('Bills', 500.0, 'year')),
+        ('get_my_recent_expenses', lambda: et.get_my_recent_expenses(5)),
+        ('calculate_with_my_expenses', lambda: asyncio.run(et.calculate_with_my_expenses(
+            f"food_{last_month:%Y_%m} * 1.18 + avg_daily_30d"))),
+        ('duplicate_my_expense', lambda: et.duplicate_my_expense(expense_ids[2], None, None)),
+        ('delete_my_expense', lambda: et.delete_my_expense(expense_ids[3])),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', default=os.getenv('QUERY_PLAN_MONGO_URI', 'mongodb://localhost:27017'),
+                        help="MongoDB to seed and explain against (never point this at production)")
+    parser.add_argument('--db', default='expenses_query_plan_check', help="Scratch database name")
+    parser.add_argument('--users', type=int, default=5, help="Number of users to seed")
+    parser.add_argument('--per-user', type=int, default=2000, help="Expenses seeded per user")
+    parser.add_argument('--max-ratio', type=float, default=2.0,
+                        help="Maximum documents examined per document returned")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch database afterwards")
+    args = parser.parse_args()
+
+    # The tools read their connection settings at import time
+    os.environ['MONGO_URI'] = args.uri
+    os.environ['MONGO_DB_NAME'] = args.db
+    recorder = CommandRecorder(args.db)
+    monitoring.register(recorder)
+
+    from mcp_servers import expense_tracker as et
+
+    admin = MongoClient(args.uri)
+    admin.drop_database(args.db)
+    db = admin[args.db]
+    try:
+        et.register('plan_check', 'secret')
+        et.login('plan_check', 'secret')
+        other_ids = [f"other-user-{i}" for i in range(args.users - 1)]
+        seed(db, [et.current_user_id] + other_ids, args.per_user)
+        expense_ids = [str(doc['_id']) for doc in db.expenses.find({'user_id': et.current_user_id}).limit(4)]
+
+        for tool, call in scenarios(et, expense_ids):
+            recorder.tool = tool
+            try:
+                call()
+            finally:
+                recorder.tool = None
+
+        failures = 0
+        for tool, command_name, command in recorder.commands:
+            explain = explain_command(db, command)
+            max_ratio = None if tool in RATIO_EXEMPT_TOOLS else args.max_ratio
+            problems = plan_problems(explain, max_ratio)
+            status = 'FAIL' if problems else 'ok  '
+            print(f"{status} {tool:<28} {command_name:<10} {plan_summary(explain)}")
+            for problem in problems:
+                print(f"       - {problem}")
+            failures += bool(problems)
+
+        covered = {tool for tool, _, _ in recorder.commands}
+        missing = sorted({tool for tool, _ in scenarios(et, expense_ids)} - covered - INSERT_ONLY_TOOLS)
+        if missing:
+            print(f"FAIL no queries recorded for: {', '.join(missing)}")
+            failures += 1
+
+        print(f"\n{len(recorder.commands)} commands checked, {failures} problem(s)")
+        return 1 if failures else 0
+    finally:
+        if not args.keep:
+            admin.drop_database(args.db)
+        admin.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Local stand-in for the AccuWeather endpoints used by the weather server.
+
+Serves the recorded payloads in ``scripts/fixtures/accuweather`` for
+``/currentconditions/v1/<key>`` and ``/locations/v1/<key>`` (any key), with
+optional latency and a share of failed responses, so the weather server can
+be run and benchmarked without an API key or network access:
+
+    python scripts/fake_accuweather.py --port 8765 --latency-ms 150 --error-rate 0.05
+    ACCUWEATHER_BASE_URL=http://127.0.0.1:8765 python mcp_servers/weather_mcp.py
+
+``GET /_stats`` returns the number of requests served per endpoint.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'accuweather')
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    fixtures = {}
+    for endpoint in ('currentconditions', 'locations'):
+        with open(os.path.join(fixtures_dir, f"{endpoint}.json"), encoding='utf-8') as f:
+            fixtures[endpoint] = json.load(f)
+    return fixtures
+
+
+class FakeAccuWeather(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fixtures, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        super().__init__(address, _Handler)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def payload(self, endpoint, location_key):
+        if endpoint == 'locations':
+            payload = copy.deepcopy(self.fixtures['locations'])
+            payload['Key'] = location_key
+            return payload
+        return self.fixtures['currentconditions']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?', 1)[0].strip('/').split('/')
+        if path == ['_stats']:
+            return self._send(200, server.stats())
+        if len(path) != 3 or path[0] not in ('currentconditions', 'locations') or path[1] != 'v1':
+            return self._send(404, {'Code': 'ResourceNotFound', 'Message': f"Unknown path {self.path}"})
+
+        endpoint, location_key = path[0], path[2]
+        server.count(endpoint)
+        delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if random.random() < server.error_rate:
+            server.count('errors')
+            return self._send(server.error_status, {'Code': 'ServiceUnavailable', 'Message': "Injected failure"})
+        self._send(200, server.payload(endpoint, location_key))
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_in_background(port=0, **options):
+    """Start a fake server on a daemon thread (port 0 picks a free one) and return it"""
+    server = FakeAccuWeather(('127.0.0.1', port), load_fixtures(), **options)
+    threading.Thread(target=server.serve_forever, name='fake-accuweather', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="Directory with currentconditions.json and locations.json")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Extra random delay of up to this much")
+    parser.add_argument('--error-rate', type=float, default=0, help="Share of requests answered with --error-status")
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server = FakeAccuWeather((args.host, args.port), load_fixtures(args.fixtures), args.latency_ms,
+                             args.jitter_ms, args.error_rate, args.error_status)
+    print(f"Fake AccuWeather listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
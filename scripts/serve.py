@@ -0,0 +1,50 @@
+"""Run the combined server with several uvicorn worker processes.
+
+Uses the stateless streamable HTTP transport, where each MCP request can be
+answered by any worker (or any replica behind a load balancer), and bearer
+tokens for login, since there is no per-process login state to share.
+
+    AUTH_TOKEN_SECRET=... MONGO_URI=... python scripts/serve.py --workers 4
+
+Clients connect to ``/<service>/mcp`` (e.g. ``/expense_tracker/mcp``). Each
+worker has its own MongoDB pool, caches and calculator workers, so size
+``MONGO_MAX_POOL_SIZE`` and ``CALC_WORKERS`` per worker. Cached expense
+aggregates are not shared either, so with more than one worker
+``EXPENSE_AGGREGATE_TTL`` defaults to 30 seconds.
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help="Worker processes (default WEB_CONCURRENCY or the number of CPUs)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    args = parser.parse_args()
+
+    os.environ.setdefault('MCP_TRANSPORT', 'streamable-http')
+    if args.workers > 1:
+        if os.environ['MCP_TRANSPORT'] != 'streamable-http':
+            sys.exit("SSE sessions are pinned to one process; use MCP_TRANSPORT=streamable-http with --workers > 1")
+        if not os.getenv('AUTH_TOKEN_SECRET'):
+            sys.exit("Set AUTH_TOKEN_SECRET so logins work on every worker")
+        # Cached expense aggregates are invalidated only on the worker that saw the write
+        os.environ.setdefault('EXPENSE_AGGREGATE_TTL', '30')
+
+    # Workers import the app by name, so the repository must be importable from them
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, os.getenv('PYTHONPATH')]))
+    sys.path.insert(0, ROOT)
+    from fastapi_server.shutdown import SHUTDOWN_GRACE_PERIOD
+    uvicorn.run('fastapi_server.server:app', host=args.host, port=args.port, workers=args.workers,
+                timeout_graceful_shutdown=SHUTDOWN_GRACE_PERIOD + 5)
+
+
+if __name__ == '__main__':
+    main()